@@ -0,0 +1,188 @@
+# admission.py
+import asyncio
+import logging
+import math
+import os
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_AUTH_PATHS = os.getenv("ADMISSION_AUTH_PATHS", "/token,/register")  # bcrypt-heavy routes
+ADMISSION_AUTH_CONCURRENCY = int(os.getenv("ADMISSION_AUTH_CONCURRENCY", "16"))
+ADMISSION_AUTH_QUEUE = int(os.getenv("ADMISSION_AUTH_QUEUE", "64"))
+ADMISSION_READ_CONCURRENCY = int(os.getenv("ADMISSION_READ_CONCURRENCY", "32"))
+ADMISSION_READ_QUEUE = int(os.getenv("ADMISSION_READ_QUEUE", "128"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "5"))
+ADMISSION_EXEMPT_PATHS = os.getenv("ADMISSION_EXEMPT_PATHS", "/health,/metrics,/static,/.well-known")
+ADMISSION_DEADLINE_HEADER = os.getenv("ADMISSION_DEADLINE_HEADER", "X-Request-Timeout-Ms")
+ANYIO_THREAD_TOKENS = os.getenv("ANYIO_THREAD_TOKENS")  # Size of the thread pool sync routes run in
+
+
+def _paths(value: str) -> tuple:
+    return tuple(path.strip() for path in value.split(",") if path.strip())
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    """Concurrency limit with a bounded FIFO wait queue for one class of routes.
+
+    A request waits at most ``max_wait`` seconds or until its client deadline. It is
+    rejected right away when the queue is full, or when the expected wait (queue position
+    times the average service time, divided by the concurrency) exceeds its budget.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.service_time = 0.0  # Moving average of the time a request holds its slot
+        self._waiters = deque()
+        # Metrics
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "deadline": 0, "timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        return position * self.service_time / self.concurrency
+
+    def _reject(self, reason: str, position: int):
+        self.shed[reason] += 1
+        raise Shed(reason, max(1.0, self.expected_wait(position)))
+
+    async def acquire(self, deadline: float = None):
+        loop = asyncio.get_running_loop()
+        budget = self.max_wait if deadline is None else min(self.max_wait, deadline - loop.time())
+        if budget <= 0:
+            self._reject("deadline", self.queued)
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        position = len(self._waiters) + 1
+        if position > self.max_queue:
+            self._reject("queue_full", position)
+        if self.expected_wait(position) > budget:
+            self._reject("deadline", position)
+
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, budget)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self._reject("timeout", position)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # The slot was already handed over; pass it on
+            else:
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, duration: float = None):
+        if duration is not None:
+            self.service_time = duration if self.service_time == 0 else 0.9 * self.service_time + 0.1 * duration
+        # Hand the slot straight to the next waiter so it cannot be taken by a newcomer
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests per route class before they reach a handler.
+
+    Shed requests get a 503 with ``Retry-After`` instead of queueing inside the server.
+    Clients can send their remaining budget in milliseconds in ``deadline_header``; a
+    request that cannot start within it is rejected rather than served to nobody.
+    """
+
+    def __init__(self, app, classes=None, auth_paths=_paths(ADMISSION_AUTH_PATHS),
+                 exempt_paths=_paths(ADMISSION_EXEMPT_PATHS), deadline_header: str = ADMISSION_DEADLINE_HEADER,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.classes = classes or default_classes()
+        self.auth_paths = auth_paths
+        self.exempt_paths = exempt_paths
+        self.deadline_header = deadline_header.lower().encode()
+        self.enabled = enabled
+
+    def classify(self, path: str):
+        if path == "/" or path.startswith(self.exempt_paths):
+            return None
+        if path.startswith(self.auth_paths):
+            return self.classes["auth"]
+        return self.classes["read"]
+
+    def _deadline(self, scope, loop):
+        for name, value in scope["headers"]:
+            if name == self.deadline_header:
+                try:
+                    return loop.time() + float(value) / 1000
+                except ValueError:
+                    return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.classify(scope["path"]) if self.enabled and scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await route_class.acquire(self._deadline(scope, loop))
+        except Shed as exc:
+            logger.warning("Shed %s request to %s (%s)", route_class.name, scope["path"], exc.reason)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        started = loop.time()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release(loop.time() - started)
+
+
+def default_classes() -> dict:
+    return {
+        "auth": RouteClass("auth", ADMISSION_AUTH_CONCURRENCY, ADMISSION_AUTH_QUEUE),
+        "read": RouteClass("read", ADMISSION_READ_CONCURRENCY, ADMISSION_READ_QUEUE),
+    }
+
+
+classes = default_classes()
+
+
+def configure_thread_limiter():
+    """Apply ANYIO_THREAD_TOKENS; must run inside the event loop (e.g. at startup)."""
+    if ANYIO_THREAD_TOKENS:
+        import anyio.to_thread
+
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(ANYIO_THREAD_TOKENS)
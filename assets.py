@@ -0,0 +1,277 @@
+# assets.py
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from email.utils import formatdate
+
+import anyio.to_thread
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are produced without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+ASSET_MEMORY_LIMIT = int(os.getenv("ASSET_MEMORY_LIMIT", str(1024 * 1024)))  # Larger files are streamed from disk
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+URL_HASH_LENGTH = 12  # Hex digits of the content hash in hashed URLs
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def _compress(body: bytes, content_type: str) -> dict:
+    """Precompressed variants of ``body``; only kept when they are actually smaller."""
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        encoding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def _parse_range(header: str, size: int):
+    """Parse a single ``bytes=`` range; returns (start, end) inclusive, None to ignore, or False if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length == 0:
+                return False
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, min(end, size - 1)
+
+
+class CachedBody:
+    """A response body with a strong ETag and its precompressed variants."""
+
+    __slots__ = ("content_type", "digest", "body", "variants", "size", "path", "mtime")
+
+    def __init__(self, content_type: str, body: bytes = None, path: str = None, digest: str = None,
+                 size: int = None, mtime: float = None):
+        self.content_type = content_type
+        self.body = body
+        self.path = path
+        self.mtime = mtime
+        self.digest = digest or hashlib.sha256(body).hexdigest()
+        self.size = len(body) if body is not None else size
+        self.variants = _compress(body, content_type) if body is not None else {}
+
+    def etag(self, encoding: str = None) -> str:
+        suffix = f"-{encoding}" if encoding else ""
+        return f'"{self.digest[:32]}{suffix}"'
+
+    def respond(self, request: Request, cache_control: str) -> Response:
+        accepted = _accepted_encodings(request)
+        encoding = next((name for name in ("br", "gzip") if name in self.variants and name in accepted), None)
+        etag = self.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+        if self.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if self.mtime is not None:
+            headers["Last-Modified"] = formatdate(self.mtime, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            return self._body_response(request, self.variants[encoding], headers)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = _parse_range(range_header, self.size)
+            if byte_range is False:
+                headers["Content-Range"] = f"bytes */{self.size}"
+                return Response(status_code=416, headers=headers)
+            if byte_range is not None:
+                start, end = byte_range
+                headers["Content-Range"] = f"bytes {start}-{end}/{self.size}"
+                return self._range_response(request, start, end, headers)
+        if self.body is not None:
+            return self._body_response(request, self.body, headers)
+        return self._range_response(request, 0, self.size - 1, headers, status_code=200)
+
+    def _body_response(self, request: Request, body: bytes, headers: dict) -> Response:
+        headers["Content-Length"] = str(len(body))
+        return Response(b"" if request.method == "HEAD" else body, media_type=self.content_type, headers=headers)
+
+    def _range_response(self, request: Request, start: int, end: int, headers: dict,
+                        status_code: int = 206) -> Response:
+        if self.body is not None:
+            response = self._body_response(request, self.body[start:end + 1], headers)
+            response.status_code = status_code
+            return response
+        headers["Content-Length"] = str(end - start + 1)
+        if request.method == "HEAD":
+            return Response(status_code=status_code, media_type=self.content_type, headers=headers)
+        return StreamingResponse(self._read(start, end), status_code=status_code,
+                                 media_type=self.content_type, headers=headers)
+
+    def _read(self, start: int, end: int, chunk_size: int = 64 * 1024):
+        with open(self.path, "rb") as handle:
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = handle.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class StaticAssets:
+    """ASGI app serving a static directory with content-hashed URLs.
+
+    ``url("animation.gif")`` returns ``/static/animation.<hash>.gif``; hashed URLs are served
+    with an immutable Cache-Control, plain ones must revalidate via their strong ETag.
+    Small files are held in memory with gzip (and brotli, if installed) variants for text
+    types; files are re-read when their mtime or size changes.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static", memory_limit: int = ASSET_MEMORY_LIMIT):
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix
+        self.memory_limit = memory_limit
+        self._lock = threading.Lock()
+        self._assets = {}
+
+    def preload(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                self._get(os.path.relpath(os.path.join(root, name), self.directory))
+
+    def _get(self, relative: str):
+        path = os.path.realpath(os.path.join(self.directory, relative))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        cached = self._assets.get(relative)
+        if cached is not None and cached.mtime == stat.st_mtime and cached.size == stat.st_size:
+            return cached
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        with open(path, "rb") as handle:
+            if stat.st_size <= self.memory_limit:
+                asset = CachedBody(content_type, body=handle.read(), path=path, mtime=stat.st_mtime)
+            else:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                asset = CachedBody(content_type, path=path, digest=digest.hexdigest(),
+                                   size=stat.st_size, mtime=stat.st_mtime)
+        with self._lock:
+            self._assets[relative] = asset
+        return asset
+
+    @staticmethod
+    def _hashed_name(relative: str, digest: str) -> str:
+        stem, ext = os.path.splitext(relative)
+        return f"{stem}.{digest[:URL_HASH_LENGTH]}{ext}"
+
+    def url(self, relative: str) -> str:
+        asset = self._get(relative)
+        if asset is None:
+            return f"{self.prefix}/{relative}"
+        return f"{self.prefix}/{self._hashed_name(relative, asset.digest)}"
+
+    def _resolve(self, relative: str):
+        asset = self._get(relative)
+        if asset is not None:
+            return asset, False
+        # name.<hash>.ext -> name.ext, only for the exact hash url() produces for the current
+        # content; truncated or stale hashes must not be cached as immutable
+        stem, ext = os.path.splitext(relative)
+        original_stem, _, digest = stem.rpartition(".")
+        if not original_stem or len(digest) != URL_HASH_LENGTH:
+            return None, False
+        asset = self._get(original_stem + ext)
+        if asset is None or asset.digest[:URL_HASH_LENGTH] != digest:
+            return None, False
+        return asset, True
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            path, root_path = scope["path"], scope.get("root_path", "")
+            # Newer Starlette keeps the mount prefix in "path", older versions strip it
+            relative = (path[len(root_path):] if path.startswith(root_path) else path).lstrip("/")
+            # stat(), and on a cache miss reading and compressing the file, off the event loop
+            asset, immutable = await anyio.to_thread.run_sync(self._resolve, relative) if relative else (None, False)
+            if asset is None:
+                response = PlainTextResponse("Not Found", status_code=404)
+            else:
+                response = asset.respond(request, IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL)
+        await response(scope, receive, send)
+
+
+class TemplateCache:
+    """Renders static (request independent) templates once and re-renders when the file changes.
+
+    ``load_templates`` returns the ``Jinja2Templates`` instance; it is called on the first render.
+    """
+
+    def __init__(self, load_templates):
+        self.load_templates = load_templates
+        self._templates = None
+        self._lock = threading.Lock()
+        self._rendered = {}
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            with self._lock:
+                if self._templates is None:
+                    self._templates = self.load_templates()
+        return self._templates
+
+    def get(self, name: str) -> CachedBody:
+        template = self.templates.env.get_template(name)
+        mtime = os.stat(template.filename).st_mtime
+        cached = self._rendered.get(name)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        body = template.render().encode()
+        cached = CachedBody("text/html; charset=utf-8", body=body, mtime=mtime)
+        with self._lock:
+            self._rendered[name] = cached
+        return cached
+
+    def respond(self, request: Request, name: str) -> Response:
+        return self.get(name).respond(request, REVALIDATE_CACHE_CONTROL)
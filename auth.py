@@ -1,16 +1,30 @@
 # auth.py
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from typing import Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # Configuration variables
-SECRET_KEY = "your_secret_key"
-ALGORITHM = "HS256"
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your_secret_key")  # Only used with HS256
+ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")  # RS256, ES256 or HS256
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")  # <kid>.pem private keys, newest name is active
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")  # Pin the signing key, e.g. while pre-publishing the next one
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", "300"))
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", "1"))  # Min. gap between rereads on unknown kid
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hash_settings = None  # Cost chosen by hash_cost.py, None means passlib's defaults
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -18,6 +32,139 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def password_needs_update(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+
+def configure_password_hashing(settings: Optional[dict]):
+    """Rebuild ``pwd_context`` for ``settings`` from ``hash_cost``.
+
+    The cost is set as the minimum as well, so only weaker hashes need an update. Hosts
+    that calibrate to different costs therefore never rehash each other's passwords back
+    and forth. bcrypt stays verifiable after switching to argon2.
+    """
+    global pwd_context, password_hash_settings
+    if settings is None:
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    elif settings["scheme"] == "argon2":
+        context = CryptContext(
+            schemes=["argon2", "bcrypt"], deprecated="auto",
+            argon2__memory_cost=settings["memory_cost"], argon2__parallelism=settings["parallelism"],
+            argon2__default_rounds=settings["time_cost"], argon2__min_rounds=settings["time_cost"],
+        )
+    else:
+        context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto",
+            bcrypt__default_rounds=settings["rounds"], bcrypt__min_rounds=settings["rounds"],
+        )
+    pwd_context, password_hash_settings = context, settings
+
+
+def _generate_private_key(algorithm: str) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith("ES"):
+        curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]
+        key = ec.generate_private_key(curve())
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+
+class KeyRing:
+    """Signing keys for asymmetric JWTs, loaded from ``<directory>/<kid>.pem``.
+
+    Every key in the directory is published in the JWKS and accepted for verification, so
+    rotating means adding the next key, letting JWKS caches pick it up, and then making it
+    active. If the directory holds no key, one is generated at startup (or on first use).
+    Keys are parsed once per load, so signing and verifying reuse the key objects.
+    """
+
+    def __init__(self, directory: str = JWT_KEYS_DIR, algorithm: str = ALGORITHM,
+                 active_kid: Optional[str] = JWT_ACTIVE_KID):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.active_kid = active_kid
+        self._lock = threading.Lock()
+        self._private = {}
+        self._public = {}
+        self._jwks = None
+        self.jwks_etag = None
+        self._loaded_at = None
+
+    def load(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            kids = sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith(".pem"))
+            if not kids:
+                kids = [self._generate()]
+            private, public = {}, {}
+            for kid in kids:
+                with open(os.path.join(self.directory, f"{kid}.pem")) as handle:
+                    private[kid] = jwk.construct(handle.read(), self.algorithm)
+                public[kid] = private[kid].public_key()
+            self._private, self._public = private, public
+            keys = [{**key.to_dict(), "kid": kid, "use": "sig", "alg": self.algorithm}
+                    for kid, key in public.items()]
+            self._jwks = json.dumps({"keys": keys}, sort_keys=True).encode()
+            self.jwks_etag = '"' + hashlib.sha256(self._jwks).hexdigest()[:32] + '"'
+            self._loaded_at = time.monotonic()
+            if self.active_kid is None or self.active_kid not in private:
+                if self.active_kid is not None:
+                    logger.warning("JWT_ACTIVE_KID %s not found, using %s", self.active_kid, kids[-1])
+                self.active_kid = kids[-1]
+
+    def _generate(self) -> str:
+        kid = time.strftime("%Y%m%d%H%M%S")
+        path = os.path.join(self.directory, f"{kid}.pem")
+        # Written under a temporary name (not matched by *.pem) and moved into place complete, so
+        # other workers never read a partial key. link() rather than rename() so a concurrently
+        # starting worker that got there first keeps its key and both share it.
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(_generate_private_key(self.algorithm))
+                handle.flush()
+                os.fsync(handle.fileno())
+            try:
+                os.link(temp_path, path)
+            except FileExistsError:
+                return kid
+        finally:
+            os.remove(temp_path)
+        logger.info("Generated JWT signing key %s", kid)
+        return kid
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            self.load()
+
+    def signing_key(self):
+        self._ensure_loaded()
+        return self.active_kid, self._private[self.active_kid]
+
+    def verification_key(self, kid: str):
+        self._ensure_loaded()
+        key = self._public.get(kid)
+        if key is None and time.monotonic() - self._loaded_at >= JWT_KEYS_RELOAD_SECONDS:
+            # Unknown kid: another worker may have generated or rotated a key, re-read the directory
+            # (rate limited, so tokens with made-up kids cannot make every request hit the disk)
+            self.load()
+            key = self._public.get(kid)
+        return key
+
+    def jwks(self) -> bytes:
+        self._ensure_loaded()
+        return self._jwks
+
+
+keyring = KeyRing()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -25,5 +172,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    if ALGORITHM.startswith("HS"):
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, private_key = keyring.signing_key()
+    encoded_jwt = jwt.encode(to_encode, private_key, algorithm=ALGORITHM, headers={"kid": kid})
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    if ALGORITHM.startswith("HS"):
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = keyring.verification_key(kid)
+    if key is None:
+        raise JWTError(f"Unknown signing key {kid!r}")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
@@ -0,0 +1,121 @@
+# benchmarks/async_mode.py
+"""Compare the sync and the async database mode of /users/me at high connection counts.
+
+Both apps run in-process behind httpx's ASGI transport against the same SQLite file
+(pysqlite for the sync mode, aiosqlite for the async mode). The token cache is disabled
+so every request performs the user lookup.
+
+Usage:
+    python -m benchmarks.async_mode --requests 2000 --concurrency 10 100 500 1000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth
+import main
+import models
+import token_cache
+from database import Base
+
+
+def build_apps(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                           pool_size=64, max_overflow=0)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=64, max_overflow=0)
+    SyncSession = sessionmaker(bind=engine, autoflush=False)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    Base.metadata.create_all(bind=engine)
+    with SyncSession() as db:
+        db.add(models.User(username="bench", email="bench@example.com",
+                           password_hash=auth.get_password_hash("bench")))
+        db.commit()
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    sync_app = FastAPI()
+    sync_app.include_router(main.sync_routes)
+    sync_app.dependency_overrides[main.get_db] = get_sync_db
+
+    async_app = FastAPI()
+    async_app.include_router(main.async_routes)
+    async_app.dependency_overrides[main.get_async_db] = get_async_db
+    return {"sync": sync_app, "async": async_app}, [engine, async_engine]
+
+
+async def run_load(app, token: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 limits=limits) as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get("/users/me", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def run(total: int, levels) -> list:
+    token_cache.cache.ttl = 0
+    token = auth.create_access_token({"sub": "bench"})
+    with tempfile.TemporaryDirectory() as directory:
+        apps, engines = build_apps(os.path.join(directory, "bench.db"))
+        results = []
+        for concurrency in levels:
+            for mode, app in apps.items():
+                stats = await run_load(app, token, total, concurrency)
+                results.append({"mode": mode, "concurrency": concurrency, **stats})
+        engines[0].dispose()
+        await engines[1].dispose()
+    return results
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500, 1000])
+    args = parser.parse_args(argv)
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args.requests, args.concurrency))
+    print(f"{'mode':<6} {'conc':>6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for result in results:
+        print(f"{result['mode']:<6} {result['concurrency']:>6} {result['rps']:>10.1f} "
+              f"{result['p50_ms']:>10.2f} {result['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
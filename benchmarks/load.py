@@ -0,0 +1,314 @@
+# benchmarks/load.py
+"""Load test /register, /token, /users/me and /health and compare against a JSON baseline.
+
+Workloads:
+    login_storm  concurrent POST /token for seeded users (one bcrypt verify each)
+    read_mix     GET /users/me with the seeded users' tokens, mixed with GET /health
+    bulk_signup  concurrent POST /register of new users (one bcrypt hash each)
+
+The app runs in-process behind httpx's ASGI transport (default) or as a uvicorn
+subprocess (--server uvicorn), in both cases against a throwaway SQLite database.
+Login throttling is disabled; admission control stays on.
+
+Usage:
+    python -m benchmarks.load --requests 500 --concurrency 50
+    python -m benchmarks.load --save benchmarks/baselines/local.json
+    python -m benchmarks.load --compare benchmarks/baselines/local.json --threshold 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import auth
+import database
+import models
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKLOADS = ("login_storm", "read_mix", "bulk_signup")
+PASSWORD = "benchmark-password"
+COMPARED = {"p95_ms": "higher", "p99_ms": "higher", "rps": "lower"}
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, statuses, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    errors = sum(1 for status in statuses if not 200 <= status < 300)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "error_rate": errors / len(statuses) if statuses else 0.0,
+        "statuses": {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+# Workloads: one request each, ``i`` is the request number
+def login_storm(client, context, i):
+    username = context["users"][i % len(context["users"])]
+    return client.post("/token", data={"username": username, "password": PASSWORD})
+
+
+def read_mix(client, context, i):
+    if i % 100 < context["health_share"] * 100:
+        return client.get("/health")
+    token = context["tokens"][i % len(context["tokens"])]
+    return client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+
+def bulk_signup(client, context, i):
+    name = f"{context['prefix']}{i}"
+    return client.post("/register", json={
+        "username": name, "email": f"{name}@example.com", "password": PASSWORD,
+        "first_name": "Bench", "last_name": "User",
+    })
+
+
+async def drive(client, workload, context, total: int, concurrency: int) -> dict:
+    """Send ``total`` requests from ``concurrency`` concurrent workers."""
+    latencies, statuses = [], []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                status = (await workload(client, context, i)).status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            statuses.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def seed(url: str, users: int, bcrypt_rounds: int) -> list:
+    """Create the schema and ``users`` users sharing one password hash of the benchmark cost."""
+    database.run_migrations(url)
+    auth.configure_password_hashing({"scheme": "bcrypt", "rounds": bcrypt_rounds})
+    password_hash = auth.get_password_hash(PASSWORD)
+    usernames = [f"user{i}" for i in range(users)]
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [
+            {"username": name, "email": f"{name}@example.com", "password_hash": password_hash}
+            for name in usernames
+        ])
+    engine.dispose()
+    return usernames
+
+
+@asynccontextmanager
+async def in_process(url: str, bcrypt_rounds: int, concurrency: int):
+    import hashing
+    import health
+    import login_tracker
+    import main
+    import password_upgrade
+    import rate_limit
+    import token_cache
+
+    engine = create_engine(url, pool_size=concurrency, max_overflow=0)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    login_tracker.buffer.session_factory = Session
+    password_upgrade.upgrader.session_factory = Session
+    health.probe.engine = engine
+    rate_limit.throttle.enabled = False
+    token_cache.cache.clear()
+    auth.configure_password_hashing({"scheme": "bcrypt", "rounds": bcrypt_rounds})
+    hashing.pool.reload()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     limits=httpx.Limits(max_connections=concurrency)) as client:
+            yield client
+    finally:
+        login_tracker.buffer.stop()
+        hashing.pool.shutdown()
+        main.app.dependency_overrides.pop(main.get_db, None)
+        engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_server(url: str, bcrypt_rounds: int, concurrency: int, workers: int):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": url,
+        "JWT_KEYS_DIR": auth.keyring.directory,
+        "BCRYPT_ROUNDS": str(bcrypt_rounds),
+        "LOGIN_RATE_LIMIT_ENABLED": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                     limits=httpx.Limits(max_connections=concurrency)) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/health/live")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                await asyncio.sleep(0.2)
+            yield client
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def run(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        auth.keyring.directory = os.path.join(directory, "keys")
+        users = seed(url, args.users, args.bcrypt_rounds)
+        context = {
+            "users": users,
+            "tokens": [auth.create_access_token({"sub": name}) for name in users],
+            "health_share": args.health_share,
+        }
+        if args.server == "uvicorn":
+            server = uvicorn_server(url, args.bcrypt_rounds, args.concurrency, args.workers)
+        else:
+            server = in_process(url, args.bcrypt_rounds, args.concurrency)
+        async with server as client:
+            for name in args.workloads:
+                workload = globals()[name]
+                # Warm-up: starts the hashing workers, fills connection pools and caches
+                context["prefix"] = f"warmup_{name}_"
+                await drive(client, workload, context, args.warmup, min(args.warmup, args.concurrency) or 1)
+                context["prefix"] = "signup"
+                results[name] = await drive(client, workload, context, args.requests, args.concurrency)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions of more than ``threshold`` percent (latency up or throughput down) or new errors."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        for key, worse in COMPARED.items():
+            if worse == "higher" and current[key] > base[key] * (1 + threshold / 100):
+                change = (current[key] / base[key] - 1) * 100 if base[key] else math.inf
+                regressions.append(f"{name}: {key} {base[key]:.1f} -> {current[key]:.1f} (+{change:.0f}%)")
+            elif worse == "lower" and current[key] < base[key] * (1 - threshold / 100):
+                change = (1 - current[key] / base[key]) * 100
+                regressions.append(f"{name}: {key} {base[key]:.1f} -> {current[key]:.1f} (-{change:.0f}%)")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {base['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return regressions
+
+
+def settings(args) -> dict:
+    return {
+        "server": args.server,
+        "workers": args.workers if args.server == "uvicorn" else 1,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "bcrypt_rounds": args.bcrypt_rounds,
+        "health_share": args.health_share,
+    }
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per workload")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--health-share", type=float, default=0.1, help="share of /health in read_mix")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail on regressions against this baseline")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed regression in percent")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    print(f"{'workload':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+              f"{result['p99_ms']:>9.2f} {result['error_rate']:>8.1%}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as handle:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "host": {"python": platform.python_version(), "platform": platform.platform(),
+                         "cpus": os.cpu_count()},
+                "settings": settings(args),
+                "results": results,
+            }, handle, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if baseline.get("settings") != settings(args):
+            print(f"Warning: baseline was recorded with different settings: {baseline.get('settings')}")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0f}% against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
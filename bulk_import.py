@@ -0,0 +1,307 @@
+# bulk_import.py
+import argparse
+import asyncio
+import codecs
+import json
+import logging
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import hashing
+import models
+import schemas
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+BULK_REGISTER_CHUNK_SIZE = int(os.getenv("BULK_REGISTER_CHUNK_SIZE", "500"))
+BULK_MAX_RECORD_CHARS = int(os.getenv("BULK_MAX_RECORD_CHARS", "65536"))  # Longer records fail the import
+
+
+class BulkPayloadError(ValueError):
+    """Raised when the request body is not a JSON array or NDJSON stream."""
+
+
+# Streaming parsers: both yield (row_number, parsed_object_or_error) and keep at most one
+# unfinished record (up to max_record_chars) buffered
+async def iter_ndjson(chunks, max_record_chars: int = BULK_MAX_RECORD_CHARS):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    row = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield row, _loads(line)
+                row += 1
+        if len(buffer) > max_record_chars:
+            raise BulkPayloadError(f"Row {row} exceeds {max_record_chars} characters")
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield row, _loads(buffer)
+
+
+async def iter_json_array(chunks, max_record_chars: int = BULK_MAX_RECORD_CHARS):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    started = finished = False
+    row = 0
+    async for chunk in chunks:
+        # Only the unparsed tail is kept, and decoding resumes at its start: complete records
+        # are never parsed twice, an unfinished one at most until it exceeds max_record_chars
+        buffer += decoder.decode(chunk)
+        pos = 0
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise BulkPayloadError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+            try:
+                obj, pos = json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely an object split across chunks, wait for more data
+                break
+            yield row, obj
+            row += 1
+        buffer = buffer[pos:]
+        if len(buffer) > max_record_chars:
+            raise BulkPayloadError(f"Malformed JSON array or row {row} exceeds {max_record_chars} characters")
+    if not finished or buffer.strip():
+        raise BulkPayloadError(f"Malformed JSON array after {row} rows")
+
+
+def _loads(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as exc:
+        return BulkPayloadError(f"Invalid JSON: {exc.msg}")
+
+
+def _rejected(row: int, username, detail: str) -> dict:
+    return {"row": row, "username": username, "status": "rejected", "detail": detail}
+
+
+def _failed(row: int, record, detail: str) -> dict:
+    username = record.get("username") if isinstance(record, dict) else None
+    return {"row": row, "username": username, "status": "failed", "detail": detail}
+
+
+# Errors that stop an import part way; committed rows stay, the rest is reported as failed
+IMPORT_INTERRUPTED = (hashing.HashingQueueFull, hashing.HashingUnavailable, OperationalError)
+
+
+# Set-based uniqueness check: one IN query per column for the whole chunk
+def find_existing(db: Session, usernames, emails):
+    taken_usernames = set(db.scalars(
+        select(models.User.username).where(models.User.username.in_(usernames))
+    )) if usernames else set()
+    taken_emails = set(db.scalars(
+        select(models.User.email).where(models.User.email.in_(emails))
+    )) if emails else set()
+    return taken_usernames, taken_emails
+
+
+def insert_rows(db: Session, rows: list) -> list:
+    """Insert ``rows`` in one executemany; fall back to row by row if a concurrent writer won a race.
+
+    Returns the indexes of the rows that could not be inserted.
+    """
+    try:
+        db.execute(insert(models.User), rows)
+        db.commit()
+        return []
+    except IntegrityError:
+        db.rollback()
+    failed = []
+    for index, row in enumerate(rows):
+        try:
+            db.execute(insert(models.User), [row])
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            failed.append(index)
+    return failed
+
+
+class BulkImporter:
+    """Registers users chunk by chunk; keeps track of names seen earlier in the same import.
+
+    If hashing or the database fails part way (``IMPORT_INTERRUPTED``), the chunks committed
+    so far stay and every other row is reported as ``failed``, so a client can resend just
+    those; ``error`` holds the exception.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = BULK_REGISTER_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.seen_usernames = set()
+        self.seen_emails = set()
+        self.results = []
+        self.error = None
+
+    async def run(self, records) -> list:
+        """Import all records; on a BulkPayloadError the rows parsed before it are still imported."""
+        chunk = []
+        try:
+            async for row, record in records:
+                if self.error is not None:
+                    self.results.append(_failed(row, record, "Not imported"))
+                    continue
+                chunk.append((row, record))
+                if len(chunk) >= self.chunk_size:
+                    await self._import_or_fail(chunk)
+                    chunk = []
+        except BulkPayloadError:
+            if chunk:
+                await self._import_or_fail(chunk)
+            raise
+        if chunk:
+            await self._import_or_fail(chunk)
+        return self.results
+
+    async def _import_or_fail(self, chunk: list):
+        if self.error is None:
+            reported = len(self.results)
+            try:
+                await self.import_chunk(chunk)
+                return
+            except IMPORT_INTERRUPTED as exc:
+                logger.error("Bulk import interrupted: %s", exc)
+                self.error = exc
+                done = {result["row"] for result in self.results[reported:]}
+                chunk = [(row, record) for row, record in chunk if row not in done]
+        for row, record in chunk:
+            self.results.append(_failed(row, record, "Not imported"))
+
+    async def import_chunk(self, chunk: list):
+        candidates = []
+        for row, record in chunk:
+            if isinstance(record, Exception):
+                self.results.append(_rejected(row, None, str(record)))
+                continue
+            try:
+                user = schemas.UserCreate.model_validate(record)
+            except ValidationError as exc:
+                username = record.get("username") if isinstance(record, dict) else None
+                self.results.append(_rejected(row, username, exc.errors()[0]["msg"]))
+                continue
+            if user.username in self.seen_usernames:
+                self.results.append(_rejected(row, user.username, "Username already registered"))
+                continue
+            if user.email in self.seen_emails:
+                self.results.append(_rejected(row, user.username, "Email already registered"))
+                continue
+            self.seen_usernames.add(user.username)
+            self.seen_emails.add(user.email)
+            candidates.append((row, user))
+        if not candidates:
+            return
+
+        taken_usernames, taken_emails = await run_in_threadpool(
+            find_existing,
+            self.db,
+            [user.username for _, user in candidates],
+            [user.email for _, user in candidates],
+        )
+        accepted = []
+        for row, user in candidates:
+            if user.username in taken_usernames:
+                self.results.append(_rejected(row, user.username, "Username already registered"))
+            elif user.email in taken_emails:
+                self.results.append(_rejected(row, user.username, "Email already registered"))
+            else:
+                accepted.append((row, user))
+        if not accepted:
+            return
+
+        hashed_passwords = await hashing.hash_passwords(user.password for _, user in accepted)
+        rows = [
+            {
+                "username": user.username,
+                "password_hash": hashed_password,
+                "email": user.email,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+            }
+            for (_, user), hashed_password in zip(accepted, hashed_passwords)
+        ]
+        failed = set(await run_in_threadpool(insert_rows, self.db, rows))
+        for index, (row, user) in enumerate(accepted):
+            if index in failed:
+                self.results.append(_rejected(row, user.username, "Username or email already registered"))
+            else:
+                self.results.append({"row": row, "username": user.username, "status": "created"})
+
+
+def summarize(results: list) -> dict:
+    results.sort(key=lambda result: result["row"])
+    created = sum(1 for result in results if result["status"] == "created")
+    failed = sum(1 for result in results if result["status"] == "failed")
+    return {"created": created, "rejected": len(results) - created - failed, "failed": failed, "results": results}
+
+
+# CLI: python bulk_import.py users.ndjson
+async def _read_file(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as handle:
+        while True:
+            chunk = await run_in_threadpool(handle.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def import_file(path: str, chunk_size: int = BULK_REGISTER_CHUNK_SIZE) -> dict:
+    from database import SessionLocal
+
+    parse = iter_ndjson if path.endswith((".ndjson", ".jsonl")) else iter_json_array
+    db = SessionLocal()
+    importer = BulkImporter(db, chunk_size)
+    try:
+        await importer.run(parse(_read_file(path)))
+    finally:
+        db.close()
+        hashing.pool.shutdown()
+    summary = summarize(importer.results)
+    if importer.error is not None:
+        summary["error"] = str(importer.error)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import users from a JSON array or NDJSON file.")
+    parser.add_argument("path", help="File with UserCreate records (.json, .ndjson or .jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_REGISTER_CHUNK_SIZE)
+    parser.add_argument("--verbose", action="store_true", help="Print the result of every row")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(import_file(args.path, args.chunk_size))
+    if args.verbose:
+        for result in summary["results"]:
+            print(json.dumps(result))
+    print(f"created={summary['created']} rejected={summary['rejected']} failed={summary['failed']}")
+    if "error" in summary:
+        print(f"Import interrupted: {summary['error']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base  # Updated import
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from contextlib import contextmanager
+import itertools
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -14,17 +21,191 @@ MYSQL_HOST = os.getenv("MYSQL_HOST")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 
-# Construct the database URL
-DATABASE_URL = f"mysql+pymysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+# Construct the database URL (DATABASE_URL overrides it, e.g. a SQLite file for benchmarks)
+DATABASE_URL = os.getenv("DATABASE_URL") or (
+    f"mysql+pymysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+)
 
-# Create the SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True  # Helps with handling dropped connections
+# Apply pending migrations in the lifespan; off by default, migrate once per deployment instead
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Async mode: endpoints use an AsyncEngine (requires an async driver such as aiomysql)
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}",
 )
 
+# Optional read replicas (comma separated SQLAlchemy URLs) and how long a failing one is skipped
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings (size the pool for the number of worker threads per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds, -1 disables recycling
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")  # Ping on every checkout
+
+
+def pool_settings() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_status(engine) -> dict:
+    status = {"class": type(engine.pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        getter = getattr(engine.pool, name, None)
+        if callable(getter):
+            status[name] = getter()
+    return status
+
+
+class ReplicaSet:
+    """Round-robin over read engines; a replica that raises a connection error is ejected for a while."""
+
+    def __init__(self, engines, eject_seconds: float = DB_REPLICA_EJECT_SECONDS):
+        self.engines = list(engines)
+        self.eject_seconds = eject_seconds
+        self._ejected_until = {}
+        self._cycle = itertools.cycle(range(len(self.engines)))
+        self._lock = threading.Lock()
+        for replica in self.engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def __bool__(self):
+        return bool(self.engines)
+
+    def _on_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.eject(context.engine)
+
+    def eject(self, replica):
+        logger.warning("Ejecting read replica %s for %.0fs", replica.url.render_as_string(hide_password=True),
+                       self.eject_seconds)
+        with self._lock:
+            self._ejected_until[replica] = time.monotonic() + self.eject_seconds
+
+    def is_healthy(self, replica) -> bool:
+        return self._ejected_until.get(replica, 0) <= time.monotonic()
+
+    def choose(self):
+        """Next healthy replica, or None if every replica is ejected."""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                replica = self.engines[next(self._cycle)]
+                if self._ejected_until.get(replica, 0) <= now:
+                    return replica
+        return None
+
+    def status(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "url": replica.url.render_as_string(hide_password=True),
+                "healthy": self._ejected_until.get(replica, 0) <= now,
+                "pool": pool_status(replica),
+            }
+            for replica in self.engines
+        ]
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica while ``info["read_only"]`` is set.
+
+    Flushes, DML statements and everything after the session's first write go to the
+    primary, so a session always reads its own writes.
+    """
+
+    def __init__(self, *args, replicas: ReplicaSet = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if clause is not None and getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        if (self.replicas and self.info.get("read_only") and not self.info.get("wrote")
+                and not self._flushing):
+            # Stay on one replica for the lifetime of the session
+            replica = self.info.get("replica")
+            if replica is None or not self.replicas.is_healthy(replica):
+                replica = self.info["replica"] = self.replicas.choose()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _pin_to_primary(session, flush_context):
+    session.info["wrote"] = True
+
+
+@contextmanager
+def read_only(db: Session):
+    """Route the queries issued inside the block to a read replica if one is configured."""
+    previous = db.info.get("read_only", False)
+    db.info["read_only"] = True
+    try:
+        yield db
+    finally:
+        db.info["read_only"] = previous
+
+
+# Create the SQLAlchemy engine
+engine = create_engine(DATABASE_URL, **pool_settings())
+replicas = ReplicaSet(create_engine(url, **pool_settings()) for url in DATABASE_REPLICA_URLS)
+
 # Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession, replicas=replicas)
+
+# Dependency to get DB session
+def get_db():
+    try:
+        db = SessionLocal()
+        yield db
+    except OperationalError:
+        logger.error("Database connection failed.")
+        raise HTTPException(status_code=503, detail="Database is unavailable")
+    finally:
+        try:
+            db.close()
+        except:
+            pass
+
+
+# Async engine and session factory, only created when async mode is enabled
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_settings())
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for our ORM models
 Base = declarative_base()
+
+
+# Schema migrations (alembic.ini / migrations/); normally run once per deployment via `alembic upgrade head`
+MIGRATIONS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def run_migrations(url: str = None, revision: str = "head"):
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(MIGRATIONS_CONFIG)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(MIGRATIONS_CONFIG), "migrations"))
+    config.attributes["configure_logger"] = False
+    if url is not None:
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    command.upgrade(config, revision)
@@ -0,0 +1,190 @@
+# hash_cost.py
+"""Pick the password hash cost for this host.
+
+Usage (prints the chosen parameters as environment variables to pin them fleet-wide):
+    python hash_cost.py [--target-ms 250] [--scheme bcrypt|argon2]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+import auth
+
+try:
+    import argon2  # noqa: F401  (passlib's argon2 backend)
+except ImportError:  # Optional: argon2 falls back to bcrypt without argon2-cffi
+    argon2 = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")  # bcrypt or argon2
+PASSWORD_HASH_CALIBRATE = os.getenv("PASSWORD_HASH_CALIBRATE", "true").lower() in ("1", "true", "yes")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))  # Latency budget per hash
+PASSWORD_HASH_MEMORY_KIB = int(os.getenv("PASSWORD_HASH_MEMORY_KIB", "65536"))  # argon2 memory budget
+PASSWORD_HASH_PARALLELISM = int(os.getenv("PASSWORD_HASH_PARALLELISM", "1"))
+PASSWORD_HASH_CACHE_FILE = os.getenv("PASSWORD_HASH_CACHE_FILE", "hash_cost.json")  # Shared by all workers on a host; empty disables
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")  # Pins the cost and skips calibration
+ARGON2_TIME_COST = os.getenv("ARGON2_TIME_COST")
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "12"))  # Never calibrate below this (passlib default)
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_MIN_TIME_COST = 2
+ARGON2_MAX_TIME_COST = 10
+
+SAMPLE_PASSWORD = "calibration-Password-1"
+
+
+def _median_seconds(context: CryptContext, samples: int) -> float:
+    durations = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(SAMPLE_PASSWORD)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def calibrate_bcrypt(target_ms: float = PASSWORD_HASH_TARGET_MS, samples: int = 3) -> dict:
+    """Largest bcrypt cost within ``target_ms``; each extra round doubles the work."""
+    probe_rounds = 8
+    duration = _median_seconds(CryptContext(schemes=["bcrypt"], bcrypt__rounds=probe_rounds), samples)
+    rounds = probe_rounds + math.floor(math.log2(target_ms / 1000 / duration))
+    return {"scheme": "bcrypt", "rounds": max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))}
+
+
+def calibrate_argon2(target_ms: float = PASSWORD_HASH_TARGET_MS, memory_kib: int = PASSWORD_HASH_MEMORY_KIB,
+                     parallelism: int = PASSWORD_HASH_PARALLELISM, samples: int = 3) -> dict:
+    """Use the whole memory budget and as many passes as fit into ``target_ms`` (time grows linearly)."""
+    context = CryptContext(schemes=["argon2"], argon2__memory_cost=memory_kib,
+                           argon2__parallelism=parallelism, argon2__rounds=1)
+    duration = _median_seconds(context, samples)
+    time_cost = math.floor(target_ms / 1000 / duration)
+    return {
+        "scheme": "argon2",
+        "memory_cost": memory_kib,
+        "parallelism": parallelism,
+        "time_cost": max(ARGON2_MIN_TIME_COST, min(ARGON2_MAX_TIME_COST, time_cost)),
+    }
+
+
+def calibrate(scheme: str = PASSWORD_HASH_SCHEME, target_ms: float = PASSWORD_HASH_TARGET_MS) -> dict:
+    if scheme == "argon2":
+        if argon2 is not None:
+            return calibrate_argon2(target_ms)
+        logger.warning("PASSWORD_HASH_SCHEME=argon2 needs argon2-cffi, using bcrypt")
+    return calibrate_bcrypt(target_ms)
+
+
+def pinned_settings():
+    """Settings fixed through the environment, or None if the cost should be calibrated."""
+    if PASSWORD_HASH_SCHEME == "argon2" and argon2 is not None and ARGON2_TIME_COST:
+        return {
+            "scheme": "argon2",
+            "memory_cost": PASSWORD_HASH_MEMORY_KIB,
+            "parallelism": PASSWORD_HASH_PARALLELISM,
+            "time_cost": int(ARGON2_TIME_COST),
+        }
+    if PASSWORD_HASH_SCHEME != "argon2" and BCRYPT_ROUNDS:
+        return {"scheme": "bcrypt", "rounds": int(BCRYPT_ROUNDS)}
+    return None
+
+
+def _cache_key() -> dict:
+    return {"scheme": PASSWORD_HASH_SCHEME, "target_ms": PASSWORD_HASH_TARGET_MS}
+
+
+def load_cached(path: str = PASSWORD_HASH_CACHE_FILE):
+    """Settings calibrated earlier on this host for the current scheme and target, or None."""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable hash cost cache %s: %s", path, exc)
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != _cache_key():
+        return None
+    return cached.get("settings")
+
+
+def store_cached(settings: dict, path: str = PASSWORD_HASH_CACHE_FILE) -> dict:
+    """Publish ``settings`` for the other workers; if another worker was first, use its settings.
+
+    The file is written under a temporary name and linked into place, so readers never see a
+    partial file and exactly one of several concurrently calibrating workers wins.
+    """
+    if load_cached(path) is None and os.path.exists(path):
+        # Calibrated for another scheme or target: replace it
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"key": _cache_key(), "settings": settings}, f)
+        os.link(tmp_path, path)
+    except FileExistsError:
+        winner = load_cached(path)
+        if winner is not None:
+            return winner
+    except OSError as exc:
+        logger.warning("Could not write hash cost cache %s: %s", path, exc)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    return settings
+
+
+def configure() -> dict:
+    """Choose the hash cost and apply it in this process.
+
+    Pinned settings win, then the host-wide cache file, and only then is the cost
+    calibrated. Every worker on a host therefore uses the same cost, otherwise each
+    would rehash the others' passwords since the cost is also the minimum.
+    The hashing pool starts its worker processes with ``auth.password_hash_settings``;
+    reload it afterwards if it may already be running.
+    """
+    settings = pinned_settings()
+    if settings is None and PASSWORD_HASH_CALIBRATE:
+        settings = load_cached(PASSWORD_HASH_CACHE_FILE) if PASSWORD_HASH_CACHE_FILE else None
+        if settings is None:
+            started = time.perf_counter()
+            settings = calibrate()
+            logger.info("Calibrated password hashing in %.0f ms: %s",
+                        (time.perf_counter() - started) * 1000, settings)
+            if PASSWORD_HASH_CACHE_FILE:
+                settings = store_cached(settings, PASSWORD_HASH_CACHE_FILE)
+    auth.configure_password_hashing(settings)
+    return settings
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark password hashing and suggest a cost.")
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--scheme", choices=("bcrypt", "argon2"), default=PASSWORD_HASH_SCHEME)
+    args = parser.parse_args(argv)
+
+    settings = calibrate(args.scheme, args.target_ms)
+    auth.configure_password_hashing(settings)
+    measured = _median_seconds(auth.pwd_context, 3) * 1000
+    print(f"# {settings['scheme']}: {measured:.0f} ms per hash (target {args.target_ms:.0f} ms)")
+    if settings["scheme"] == "argon2":
+        print("PASSWORD_HASH_SCHEME=argon2")
+        print(f"PASSWORD_HASH_MEMORY_KIB={settings['memory_cost']}")
+        print(f"PASSWORD_HASH_PARALLELISM={settings['parallelism']}")
+        print(f"ARGON2_TIME_COST={settings['time_cost']}")
+    else:
+        print(f"BCRYPT_ROUNDS={settings['rounds']}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,165 @@
+# hashing.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import auth
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 1))
+HASH_POOL_MAX_PENDING = int(os.getenv("HASH_POOL_MAX_PENDING", max(HASH_POOL_WORKERS, 1) * 8))
+
+
+class HashingQueueFull(Exception):
+    """Raised when the hashing pool already has too many pending calls."""
+
+
+class HashingUnavailable(Exception):
+    """Raised when the hashing worker processes died while handling a call."""
+
+
+# Worker functions (run inside the pool processes, must stay module level to be picklable)
+def _init_worker(settings):
+    # Spawned workers import auth afresh; apply the cost the parent chose (see hash_cost.py)
+    auth.configure_password_hashing(settings)
+
+
+def _timed_hash(password: str):
+    start = time.perf_counter()
+    hashed = auth.get_password_hash(password)
+    return hashed, time.perf_counter() - start
+
+
+def _timed_hash_many(passwords):
+    start = time.perf_counter()
+    hashed = [auth.get_password_hash(password) for password in passwords]
+    return hashed, time.perf_counter() - start
+
+
+def _timed_verify(plain_password: str, hashed_password: str):
+    start = time.perf_counter()
+    valid = auth.verify_password(plain_password, hashed_password)
+    return valid, time.perf_counter() - start
+
+
+class HashingPool:
+    """Process pool dedicated to bcrypt so hashing never occupies the request threads.
+
+    The executor is created on first use. At most ``max_pending`` calls may be queued or
+    running at once; further calls are rejected with :class:`HashingQueueFull`. With
+    ``workers=0`` the calls run on the event loop's default thread executor instead.
+    """
+
+    def __init__(self, workers: int = HASH_POOL_WORKERS, max_pending: int = HASH_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._observers = []
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def add_observer(self, callback):
+        """Register ``callback(operation, total_seconds, compute_seconds)`` for every finished call."""
+        self._observers.append(callback)
+
+    def _get_executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(auth.password_hash_settings,),
+                )
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, operation: str, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingQueueFull(f"{self._pending} hashing calls pending")
+            self._pending += 1
+        started = time.perf_counter()
+        executor = None
+        try:
+            executor = self._get_executor()
+            loop = asyncio.get_running_loop()
+            result, compute = await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            logger.error("Hashing worker pool broke, it will be recreated on the next call.")
+            self._reset_executor(executor)
+            raise HashingUnavailable("hashing workers are unavailable")
+        finally:
+            with self._lock:
+                self._pending -= 1
+        total = time.perf_counter() - started
+        logger.debug("%s took %.1f ms (%.1f ms compute)", operation, total * 1000, compute * 1000)
+        for callback in self._observers:
+            callback(operation, total, compute)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _timed_hash, password)
+
+    async def hash_many(self, passwords) -> list:
+        """Hash a batch of passwords, split into one slice per worker process."""
+        passwords = list(passwords)
+        if not passwords:
+            return []
+        slices = max(1, min(self.workers, len(passwords)))
+        size = -(-len(passwords) // slices)
+        parts = await asyncio.gather(*(
+            self._submit("hash_many", _timed_hash_many, passwords[i:i + size])
+            for i in range(0, len(passwords), size)
+        ))
+        return [hashed for part in parts for hashed in part]
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit("verify", _timed_verify, plain_password, hashed_password)
+
+    def reload(self):
+        """Start fresh workers on next use, e.g. after the hash cost changed; running calls finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+pool = HashingPool()
+
+
+async def hash_password(password: str) -> str:
+    return await pool.hash(password)
+
+
+async def hash_passwords(passwords) -> list:
+    return await pool.hash_many(passwords)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await pool.verify(plain_password, hashed_password)
@@ -0,0 +1,84 @@
+# health.py
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+DB_PING_INTERVAL_SECONDS = float(os.getenv("DB_PING_INTERVAL_SECONDS", "5"))
+DB_PING_MAX_STALENESS_SECONDS = float(os.getenv("DB_PING_MAX_STALENESS_SECONDS", "15"))
+
+
+class DatabaseProbe:
+    """Pings the database from a background thread and caches the outcome.
+
+    Readiness checks only read the cached result, so probes never open a session or wait
+    on the database. A result older than ``max_staleness`` counts as not ready, which
+    also covers a ping that hangs.
+    """
+
+    def __init__(self, engine=None, interval: float = DB_PING_INTERVAL_SECONDS,
+                 max_staleness: float = DB_PING_MAX_STALENESS_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.ok = False
+        self.error = "not checked yet"
+        self.checked_at = None
+        self.latency = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def check_now(self) -> bool:
+        if self.engine is None:
+            from database import engine
+            self.engine = engine
+        started = time.monotonic()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            ok, error = True, None
+        except SQLAlchemyError as exc:
+            ok, error = False, exc.__class__.__name__
+        finished = time.monotonic()
+        if ok != self.ok:
+            logger.log(logging.INFO if ok else logging.WARNING, "Database readiness changed to %s", ok)
+        self.ok, self.error, self.latency, self.checked_at = ok, error, finished - started, finished
+        return ok
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name="db-ping", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.check_now()
+            self._stopping.wait(self.interval)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def status(self) -> dict:
+        self.start()
+        age = None if self.checked_at is None else time.monotonic() - self.checked_at
+        stale = age is None or age > self.max_staleness
+        return {
+            "ready": self.ok and not stale,
+            "database": "ok" if self.ok else "unavailable",
+            "error": "stale result" if self.ok and stale else self.error,
+            "checked_seconds_ago": None if age is None else round(age, 3),
+            "ping_ms": None if self.latency is None else round(self.latency * 1000, 3),
+        }
+
+
+probe = DatabaseProbe()
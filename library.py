@@ -0,0 +1,394 @@
+# library.py
+import asyncio
+import importlib.util
+import logging
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import get_db
+import models
+import schemas
+
+# Optional: the /graphql endpoint is only served when graphql-core is installed. It is
+# imported and the schema built on the first query, which keeps it out of the cold start.
+GRAPHQL_AVAILABLE = importlib.util.find_spec("graphql") is not None
+graphql = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Uebung5", "schema.graphql")
+
+router = APIRouter()
+
+
+# Batched relation queries: one query for any number of parents
+def load_authors_for_books(db: Session, book_ids) -> dict:
+    rows = db.execute(
+        select(models.book_authors.c.book_id, models.Author)
+        .join(models.Author, models.Author.id == models.book_authors.c.author_id)
+        .where(models.book_authors.c.book_id.in_(book_ids))
+        .order_by(models.Author.id)
+    ).all()
+    authors = {book_id: [] for book_id in book_ids}
+    for book_id, author in rows:
+        authors[book_id].append(author)
+    return authors
+
+
+def load_books_for_authors(db: Session, author_ids) -> dict:
+    rows = db.execute(
+        select(models.book_authors.c.author_id, models.Book)
+        .join(models.Book, models.Book.id == models.book_authors.c.book_id)
+        .where(models.book_authors.c.author_id.in_(author_ids))
+        .order_by(models.Book.id)
+    ).all()
+    books = {author_id: [] for author_id in author_ids}
+    for author_id, book in rows:
+        books[author_id].append(book)
+    return books
+
+
+def load_by_ids(model):
+    def load(db: Session, ids) -> dict:
+        return {row.id: row for row in db.scalars(select(model).where(model.id.in_(ids)))}
+    return load
+
+
+class BatchLoader:
+    """DataLoader-style batching for one request.
+
+    ``load(key)`` returns a future; all keys requested while the resolvers of one level run
+    are collected and fetched with a single ``batch_fn(db, keys)`` call in the thread pool.
+    A per-request lock keeps the loaders from using the session concurrently.
+    """
+
+    def __init__(self, db: Session, batch_fn, lock: asyncio.Lock, default=None):
+        self.db = db
+        self.batch_fn = batch_fn
+        self.lock = lock
+        self.default = default
+        self._futures = {}
+        self._queue = []
+
+    def load(self, key):
+        future = self._futures.get(key)
+        if future is None:
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                asyncio.ensure_future(self._dispatch())
+        return future
+
+    async def _dispatch(self):
+        # Let sibling resolvers of the same level enqueue their keys before querying
+        stable = 0
+        while stable < 2:
+            queued = len(self._queue)
+            await asyncio.sleep(0)
+            stable = stable + 1 if len(self._queue) == queued else 0
+        keys, self._queue = self._queue, []
+        try:
+            async with self.lock:
+                results = await run_in_threadpool(self.batch_fn, self.db, keys)
+        except Exception as exc:
+            for key in keys:
+                self._futures.pop(key).set_exception(exc)
+            return
+        for key in keys:
+            value = results.get(key)
+            self._futures[key].set_result(self.default() if value is None and self.default else value)
+
+
+class Loaders:
+    def __init__(self, db: Session):
+        self.lock = asyncio.Lock()
+        self.authors_by_book = BatchLoader(db, load_authors_for_books, self.lock, default=list)
+        self.books_by_author = BatchLoader(db, load_books_for_authors, self.lock, default=list)
+        self.book = BatchLoader(db, load_by_ids(models.Book), self.lock)
+        self.author = BatchLoader(db, load_by_ids(models.Author), self.lock)
+
+
+# Serialization for the REST endpoints
+def book_summary(book: models.Book) -> dict:
+    return {
+        "id": str(book.id),
+        "title": book.title,
+        "description": book.description,
+        "publicationYear": book.publication_year,
+    }
+
+
+def author_summary(author: models.Author) -> dict:
+    return {"id": str(author.id), "name": author.name, "birthdate": author.birthdate}
+
+
+def serialize_books(db: Session, books) -> list:
+    authors = load_authors_for_books(db, [book.id for book in books]) if books else {}
+    return [
+        {**book_summary(book), "authors": [author_summary(author) for author in authors[book.id]]}
+        for book in books
+    ]
+
+
+def serialize_authors(db: Session, authors) -> list:
+    books = load_books_for_authors(db, [author.id for author in authors]) if authors else {}
+    return [
+        {**author_summary(author), "books": [book_summary(book) for book in books[author.id]]}
+        for author in authors
+    ]
+
+
+def parse_id(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+def get_or_404(db: Session, model, id_value):
+    instance = db.get(model, parse_id(id_value))
+    if instance is None:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+    return instance
+
+
+def resolve_authors(db: Session, author_ids) -> list:
+    ids = {parse_id(author_id) for author_id in author_ids}
+    authors = db.scalars(select(models.Author).where(models.Author.id.in_(ids))).all() if ids else []
+    if len(authors) != len(ids):
+        raise HTTPException(status_code=400, detail="Unknown author id")
+    return list(authors)
+
+
+def apply_book_input(db: Session, book: models.Book, book_input: schemas.BookInput):
+    book.title = book_input.title
+    book.description = book_input.description
+    book.publication_year = book_input.publicationYear
+    book.authors = resolve_authors(db, book_input.authors)
+
+
+def apply_author_input(author: models.Author, author_input: schemas.AuthorInput):
+    author.name = author_input.name
+    author.birthdate = author_input.birthdate
+
+
+# Shared write operations (REST and GraphQL)
+def create_book(db: Session, book_input: schemas.BookInput) -> models.Book:
+    book = models.Book()
+    apply_book_input(db, book, book_input)
+    db.add(book)
+    db.commit()
+    return book
+
+
+def update_book(db: Session, book_id, book_input: schemas.BookInput) -> models.Book:
+    book = get_or_404(db, models.Book, book_id)
+    apply_book_input(db, book, book_input)
+    db.commit()
+    return book
+
+
+def delete_book(db: Session, book_id):
+    db.delete(get_or_404(db, models.Book, book_id))
+    db.commit()
+
+
+def create_author(db: Session, author_input: schemas.AuthorInput) -> models.Author:
+    author = models.Author()
+    apply_author_input(author, author_input)
+    db.add(author)
+    db.commit()
+    return author
+
+
+def update_author(db: Session, author_id, author_input: schemas.AuthorInput) -> models.Author:
+    author = get_or_404(db, models.Author, author_id)
+    apply_author_input(author, author_input)
+    db.commit()
+    return author
+
+
+# REST endpoints
+@router.get("/books", response_model=list[schemas.Book])
+def list_books(db: Session = Depends(get_db)):
+    return serialize_books(db, db.scalars(select(models.Book).order_by(models.Book.id)).all())
+
+
+@router.post("/books", response_model=schemas.Book, status_code=status.HTTP_201_CREATED)
+def create_book_endpoint(book_input: schemas.BookInput, db: Session = Depends(get_db)):
+    return serialize_books(db, [create_book(db, book_input)])[0]
+
+
+@router.get("/books/{id}", response_model=schemas.Book)
+def read_book(id: str, db: Session = Depends(get_db)):
+    return serialize_books(db, [get_or_404(db, models.Book, id)])[0]
+
+
+@router.put("/books/{id}", response_model=schemas.Book)
+def update_book_endpoint(id: str, book_input: schemas.BookInput, db: Session = Depends(get_db)):
+    return serialize_books(db, [update_book(db, id, book_input)])[0]
+
+
+@router.delete("/books/{id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_book_endpoint(id: str, db: Session = Depends(get_db)):
+    delete_book(db, id)
+
+
+@router.get("/authors", response_model=list[schemas.Author])
+def list_authors(db: Session = Depends(get_db)):
+    return serialize_authors(db, db.scalars(select(models.Author).order_by(models.Author.id)).all())
+
+
+@router.post("/authors", response_model=schemas.Author, status_code=status.HTTP_201_CREATED)
+def create_author_endpoint(author_input: schemas.AuthorInput, db: Session = Depends(get_db)):
+    return serialize_authors(db, [create_author(db, author_input)])[0]
+
+
+@router.get("/authors/{id}", response_model=schemas.Author)
+def read_author(id: str, db: Session = Depends(get_db)):
+    return serialize_authors(db, [get_or_404(db, models.Author, id)])[0]
+
+
+@router.put("/authors/{id}", response_model=schemas.Author)
+def update_author_endpoint(id: str, author_input: schemas.AuthorInput, db: Session = Depends(get_db)):
+    return serialize_authors(db, [update_author(db, id, author_input)])[0]
+
+
+# GraphQL (schema from Uebung5/schema.graphql); nested relations go through the request's Loaders
+async def _run(info, fn, *args):
+    async with info.context["lock"]:
+        try:
+            return await run_in_threadpool(fn, info.context["db"], *args)
+        except HTTPException as exc:
+            raise graphql.GraphQLError(str(exc.detail))
+
+
+def _graphql_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def resolve_books(_, info):
+    return await _run(info, lambda db: db.scalars(select(models.Book).order_by(models.Book.id)).all())
+
+
+async def resolve_authors_list(_, info):
+    return await _run(info, lambda db: db.scalars(select(models.Author).order_by(models.Author.id)).all())
+
+
+async def resolve_book(_, info, id):
+    key = _graphql_id(id)
+    return None if key is None else await info.context["loaders"].book.load(key)
+
+
+async def resolve_author(_, info, id):
+    key = _graphql_id(id)
+    return None if key is None else await info.context["loaders"].author.load(key)
+
+
+def _refreshed(write):
+    """Reload the committed row in the same worker thread; otherwise the attributes expired by
+    the commit are lazily refreshed on the event loop, outside the loader lock."""
+    def run(db: Session, *args):
+        instance = write(db, *args)
+        db.refresh(instance)
+        return instance
+    return run
+
+
+async def resolve_create_book(_, info, input):
+    return await _run(info, _refreshed(create_book), schemas.BookInput(**input))
+
+
+async def resolve_update_book(_, info, id, input):
+    return await _run(info, _refreshed(update_book), id, schemas.BookInput(**input))
+
+
+async def resolve_delete_book(_, info, id):
+    await _run(info, delete_book, id)
+    return True
+
+
+async def resolve_create_author(_, info, input):
+    return await _run(info, _refreshed(create_author), schemas.AuthorInput(**input))
+
+
+async def resolve_update_author(_, info, id, input):
+    return await _run(info, _refreshed(update_author), id, schemas.AuthorInput(**input))
+
+
+def build_graphql_schema():
+    with open(SCHEMA_PATH) as handle:
+        schema = graphql.build_schema(handle.read())
+    resolvers = {
+        "Query": {
+            "books": resolve_books,
+            "book": resolve_book,
+            "authors": resolve_authors_list,
+            "author": resolve_author,
+        },
+        "Mutation": {
+            "createBook": resolve_create_book,
+            "updateBook": resolve_update_book,
+            "deleteBook": resolve_delete_book,
+            "createAuthor": resolve_create_author,
+            "updateAuthor": resolve_update_author,
+        },
+        "Book": {
+            "publicationYear": lambda book, info: book.publication_year,
+            "authors": lambda book, info: info.context["loaders"].authors_by_book.load(book.id),
+        },
+        "Author": {
+            "books": lambda author, info: info.context["loaders"].books_by_author.load(author.id),
+        },
+    }
+    for type_name, fields in resolvers.items():
+        for field_name, resolve in fields.items():
+            schema.type_map[type_name].fields[field_name].resolve = resolve
+    return schema
+
+
+_graphql_schema = None
+
+
+def get_graphql_schema():
+    global graphql, _graphql_schema
+    if _graphql_schema is None:
+        import graphql as graphql_module
+
+        graphql = graphql_module
+        _graphql_schema = build_graphql_schema()
+    return _graphql_schema
+
+
+if GRAPHQL_AVAILABLE:
+    @router.post("/graphql")
+    async def graphql_endpoint(request: Request, db: Session = Depends(get_db)):
+        schema = get_graphql_schema()
+        try:
+            payload = await request.json()
+        except ValueError:  # Includes JSONDecodeError and undecodable bytes
+            payload = None
+        if not isinstance(payload, dict):
+            return JSONResponse(
+                {"data": None, "errors": [{"message": "Request body must be a JSON object"}]}, status_code=400
+            )
+        loaders = Loaders(db)
+        result = await graphql.graphql(
+            schema,
+            payload.get("query", ""),
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+            context_value={"db": db, "loaders": loaders, "lock": loaders.lock},
+        )
+        body = {"data": result.data}
+        if result.errors:
+            body["errors"] = [error.formatted for error in result.errors]
+        return JSONResponse(body, status_code=200 if result.data is not None else 400)
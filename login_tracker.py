@@ -0,0 +1,155 @@
+# login_tracker.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import SQLAlchemyError
+
+import models
+import token_cache
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+LAST_LOGIN_FLUSH_INTERVAL_MS = int(os.getenv("LAST_LOGIN_FLUSH_INTERVAL_MS", "1000"))
+LAST_LOGIN_FLUSH_MAX_ENTRIES = int(os.getenv("LAST_LOGIN_FLUSH_MAX_ENTRIES", "500"))
+
+
+class LastLoginBuffer:
+    """Write-behind buffer for ``User.last_login``.
+
+    Logins only record ``user_id -> timestamp`` in memory (newest wins). A background
+    thread writes the buffer in one ``UPDATE ... CASE`` every ``interval_ms`` or as soon as
+    ``max_entries`` users are waiting. Failed flushes are merged back and retried.
+    """
+
+    def __init__(self, session_factory=None, interval_ms: int = LAST_LOGIN_FLUSH_INTERVAL_MS,
+                 max_entries: int = LAST_LOGIN_FLUSH_MAX_ENTRIES):
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._oldest = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        # Metrics
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_flushed = 0
+        self.last_batch_size = 0
+        self.last_flush_lag = 0.0
+        self.last_flush_duration = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def alive(self) -> bool:
+        """False once the flush thread has died (or was stopped); True before it is first needed."""
+        return self._thread is None or self._thread.is_alive()
+
+    def record(self, user_id: int, username: str, when: datetime = None):
+        when = when or datetime.now(timezone.utc)
+        with self._lock:
+            self._merge(user_id, username, when)
+            full = len(self._pending) >= self.max_entries
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def _merge(self, user_id, username, when, queued_at: Optional[float] = None):
+        # queued_at: when the entry was first buffered, kept when a failed batch is merged back
+        current = self._pending.get(user_id)
+        if current is None or current[1] < when:
+            self._pending[user_id] = (username, when)
+        queued_at = time.monotonic() if queued_at is None else queued_at
+        if self._oldest is None or queued_at < self._oldest:
+            self._oldest = queued_at
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Never let the thread die: the buffer would grow and last_login stop updating
+                logger.exception("last_login flush failed")
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                oldest, self._oldest = self._oldest, None
+            if not batch:
+                return 0
+            started = time.monotonic()
+            try:
+                self._write(batch)
+            except Exception as exc:
+                self.flush_errors += 1
+                if isinstance(exc, SQLAlchemyError):
+                    logger.error("Failed to flush %d last_login updates: %s", len(batch), exc)
+                else:
+                    logger.exception("Failed to flush %d last_login updates", len(batch))
+                with self._lock:
+                    for user_id, (username, when) in batch.items():
+                        self._merge(user_id, username, when, oldest)
+                return 0
+            finished = time.monotonic()
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            self.last_batch_size = len(batch)
+            self.last_flush_lag = finished - oldest
+            self.last_flush_duration = finished - started
+        for username, _ in batch.values():
+            token_cache.cache.invalidate_user(username)
+        return len(batch)
+
+    def _write(self, batch: dict):
+        if self.session_factory is None:
+            from database import SessionLocal
+            self.session_factory = SessionLocal
+        statement = (
+            update(models.User)
+            .where(models.User.user_id.in_(batch))
+            .values(last_login=case(
+                {user_id: when for user_id, (_, when) in batch.items()},
+                value=models.User.user_id,
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        db = self.session_factory()
+        try:
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+
+    def stop(self):
+        """Stop the background thread and drain whatever is still buffered."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+buffer = LastLoginBuffer()
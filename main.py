@@ -1,32 +1,90 @@
 # main.py
+import startup  # First, so the startup report covers all imports below
 import logging
-from datetime import timedelta
+import math
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import APIRouter, BackgroundTasks, FastAPI, Depends, HTTPException, Query, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from jose import JWTError
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
 
-from database import SessionLocal, engine, Base
+from database import engine, get_db
+import admission
+import assets
 import auth
+import database
+import bulk_import
+import hash_cost
+import hashing
+import health
+import library
+import login_tracker
+import metrics
 import models
+import password_upgrade
+import profiling
+import rate_limit
 import schemas
+import structured_logging
+import token_cache
+import user_queries
+import user_search
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession  # Only imported at runtime in async mode (database.py)
+
+startup.report.mark("imports")
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Lifespan: everything that must happen before serving (timed in the startup report) and the shutdown drain.
+# The schema is managed by Alembic (`alembic upgrade head`), not created here on every boot.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Set up logging: records are queued and written by a background thread (NDJSON file and console)
+    structured_logging.configure()
+    if database.DB_MIGRATE_ON_STARTUP:
+        with startup.report.phase("migrations"):
+            try:
+                database.run_migrations()
+            except OperationalError:
+                logger.error("Could not connect to the database. Migrations were not applied.")
+    with startup.report.phase("static_assets"):
+        static_assets.preload()
+    with startup.report.phase("signing_keys"):
+        # Read (or generate) the JWT keys now rather than on the first login
+        if not auth.ALGORITHM.startswith("HS"):
+            auth.keyring.load()
+    with startup.report.phase("hash_cost"):
+        # Pick the hash cost for this host before the hashing workers start
+        hash_cost.configure()
+        hashing.pool.reload()
+    admission.configure_thread_limiter()
+    health.probe.start()
+    startup.report.ready()
+    yield
+    # Stop the readiness ping, drain pending last_login updates and stop the hashing worker processes
+    health.probe.stop()
+    login_tracker.buffer.stop()
+    hashing.pool.shutdown()
+    structured_logging.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Admission control per route class (innermost, so shed responses still get CORS headers and metrics)
+app.add_middleware(admission.AdmissionMiddleware, classes=admission.classes)
 
 origins = ["*"]
  
@@ -38,77 +96,368 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount the static files directory
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# On-demand profiling (admin header or sampled requests); not installed at all unless PROFILING_ENABLED
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware, routes_app=app)
 
-# Set up the Jinja2 templates directory
-templates = Jinja2Templates(directory="templates")
+# Metrics: per-route latency, SQL timing, pool state and bcrypt durations
+app.add_middleware(metrics.MetricsMiddleware, routes_app=app)
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Access log and request IDs (outermost, so every other log record of the request carries the ID)
+app.add_middleware(structured_logging.AccessLogMiddleware)
+
+metrics.instrument_engine(engine)
+for index, replica in enumerate(database.replicas.engines):
+    metrics.instrument_engine(replica, name=f"replica{index}")
+hashing.pool.add_observer(metrics.observe_hashing)
+metrics.registry.gauge(
+    "password_hash_pending", "Hashing calls queued or running in the worker pool.",
+    callback=lambda: {(): hashing.pool.pending},
+)
+metrics.registry.gauge(
+    "token_cache_entries", "Verified tokens held in the token cache.",
+    callback=lambda: {(): len(token_cache.cache)},
+)
+metrics.registry.gauge(
+    "token_cache_lookups", "Token cache lookups by result since start.", ("result",),
+    callback=lambda: {("hit",): token_cache.cache.hits, ("miss",): token_cache.cache.misses},
+)
+metrics.registry.gauge(
+    "last_login_pending", "last_login updates waiting to be flushed.",
+    callback=lambda: {(): login_tracker.buffer.pending},
+)
+metrics.registry.gauge(
+    "last_login_flush_batch_size", "Rows written by the most recent last_login flush.",
+    callback=lambda: {(): login_tracker.buffer.last_batch_size},
+)
+metrics.registry.gauge(
+    "last_login_flush_lag_seconds", "Age of the oldest update in the most recent last_login flush.",
+    callback=lambda: {(): login_tracker.buffer.last_flush_lag},
+)
+metrics.registry.gauge(
+    "last_login_rows_flushed", "last_login rows written since start.",
+    callback=lambda: {(): login_tracker.buffer.rows_flushed},
+)
+metrics.registry.gauge(
+    "last_login_flush_errors", "Failed last_login flushes since start (batches are retried).",
+    callback=lambda: {(): login_tracker.buffer.flush_errors},
+)
+metrics.registry.gauge(
+    "last_login_flusher_up", "1 while the last_login flush thread is running (or not yet needed).",
+    callback=lambda: {(): int(login_tracker.buffer.alive)},
+)
+metrics.registry.gauge(
+    "login_throttled", "Login attempts rejected by the rate limiter since start.", ("bucket",),
+    callback=lambda: {(scope,): count for scope, count in rate_limit.throttle.throttled.items()},
+)
+metrics.registry.gauge(
+    "login_rate_buckets", "Token buckets currently held by the login rate limiter.",
+    callback=lambda: {(): rate_limit.throttle.buckets},
+)
+metrics.registry.gauge(
+    "password_rehash", "Password hash upgrades after login by result since start.", ("result",),
+    callback=lambda: {(result,): count for result, count in password_upgrade.upgrader.results.items()},
+)
+metrics.registry.gauge(
+    "log_records_dropped", "Log records not written since start, by reason.", ("reason",),
+    callback=lambda: {(reason,): count for reason, count in structured_logging.stats.items()},
+)
+metrics.registry.gauge(
+    "startup_phase_seconds", "Duration of each cold-start phase of this process.", ("phase",),
+    callback=lambda: {(phase,): seconds for phase, seconds in startup.report.phases.items()},
+)
+metrics.registry.gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot.", ("route_class",),
+    callback=lambda: {(name,): route_class.queued for name, route_class in admission.classes.items()},
+)
+metrics.registry.gauge(
+    "admission_active", "Requests holding an admission slot.", ("route_class",),
+    callback=lambda: {(name,): route_class.active for name, route_class in admission.classes.items()},
+)
+metrics.registry.gauge(
+    "admission_shed", "Requests rejected by admission control since start.", ("route_class", "reason"),
+    callback=lambda: {
+        (name, reason): count
+        for name, route_class in admission.classes.items()
+        for reason, count in route_class.shed.items()
+    },
+)
 
+# Mount the static files directory (content-hashed URLs, strong ETags, precompressed variants, ranges)
+static_assets = assets.StaticAssets(directory="static")
+app.mount("/static", static_assets, name="static")
+
+# Set up the Jinja2 templates directory on first render; request-independent pages are rendered once
+def load_templates():
+    from fastapi.templating import Jinja2Templates
+
+    templates = Jinja2Templates(directory="templates")
+    templates.env.globals["asset_url"] = static_assets.url
+    return templates
 
-# Dependency to get DB session
-def get_db():
-    try:
-        db = SessionLocal()
-        yield db
-    except OperationalError:
-        logger.error("Database connection failed.")
-        raise HTTPException(status_code=503, detail="Database is unavailable")
-    finally:
-        try:
-            db.close()
-        except:
-            pass
 
+rendered_templates = assets.TemplateCache(load_templates)
 
-# Utility function to get user by username
-def get_user(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+# OAuth2 scheme
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-# Authenticate user
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+# Authenticate user (bcrypt runs in the hashing pool, the lookup in the thread pool);
+# the only read path that loads password_hash
+async def authenticate_user(db: Session, username: str, password: str,
+                            background_tasks: Optional[BackgroundTasks] = None):
+    user = await run_in_threadpool(user_queries.get_user_credentials, db, username)
     if not user:
         return False
-    if not auth.verify_password(password, user.password_hash):
+    if not await hashing.verify_password(password, user.password_hash):
         return False
+    schedule_rehash(user, password, background_tasks)
     return user
 
 
-# Get current user dependency
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# Hashes weaker than the current cost are rehashed after the response is sent
+def schedule_rehash(user, password: str, background_tasks: Optional[BackgroundTasks]):
+    if background_tasks is not None and password_upgrade.upgrader.needs_upgrade(user.user_id, user.password_hash):
+        background_tasks.add_task(password_upgrade.upgrader.upgrade, user.user_id, password, user.password_hash)
+
+
+# Decode a bearer token into its claims and TokenData
+def decode_token(token: str, credentials_exception: HTTPException):
     try:
-        payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        payload = auth.decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
+        return payload, schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+
+
+# Claims downstream services need without calling back into this service
+def token_claims(user) -> dict:
+    return {"sub": user.username, "uid": user.user_id, "email": user.email}
+
+
+def credentials_error():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+# Get current user dependency (verified tokens are served from token_cache)
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = credentials_error()
+
+    def load_principal():
+        payload, token_data = decode_token(token, credentials_exception)
+        user = None
+        try:
+            with database.read_only(db):
+                user = user_queries.get_user_profile(db, token_data.username)
+        except OperationalError:
+            logger.warning("Read replica failed, falling back to the primary.")
+            db.rollback()
+        if user is None:
+            # Not (yet) on the replica, e.g. replication lag right after registration
+            user = user_queries.get_user_profile(db, token_data.username)
+        if user is None:
+            raise credentials_exception
+        return payload, schemas.UserResponse.model_validate(user), user.username
+
+    return token_cache.cache.get_or_load(token, load_principal).principal
+
+
+# Admin-only dependency (admins are listed in ADMIN_USERNAMES)
+def get_current_admin(current_user: schemas.UserResponse = Depends(get_current_user)):
+    if current_user.username not in auth.ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+# Uniqueness checks for a new registration
+def ensure_user_is_new(db: Session, user: schemas.UserCreate):
+    username_taken, email_taken = user_queries.find_taken(db, user.username, user.email)
+    if username_taken:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    if email_taken:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+
+def store_user(db: Session, new_user: models.User):
+    db.add(new_user)
+    try:
+        db.commit()
+        db.refresh(new_user)
+    except OperationalError:
+        logger.error("Failed to commit new user to the database.")
+        raise HTTPException(status_code=503, detail="Database is unavailable")
+    return new_user
+
+
+# Login throttling per client IP and username; runs before the password is hashed
+def throttle_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    client_ip = request.client.host if request.client else "unknown"
+    rate_limit.throttle.check(client_ip, form_data.username)
+
+
+# Routes that exist in a sync-session and an async-session flavour, see DB_ASYNC
+sync_routes = APIRouter()
+async_routes = APIRouter()
 
 
 # Registration endpoint
-@app.post("/register", response_model=schemas.UserResponse)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user(db, username=user.username)
-    if db_user:
+@sync_routes.post("/register", response_model=schemas.UserResponse)
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    await run_in_threadpool(ensure_user_is_new, db, user)
+    hashed_password = await hashing.hash_password(user.password)
+    new_user = models.User(
+        username=user.username,
+        password_hash=hashed_password,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name
+    )
+    return await run_in_threadpool(store_user, db, new_user)
+
+
+# Bulk registration endpoint (admins only): accepts a JSON array or NDJSON (application/x-ndjson) of UserCreate
+@app.post("/register/bulk")
+async def register_bulk(request: Request, admin: schemas.UserResponse = Depends(get_current_admin),
+                        db: Session = Depends(get_db)):
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = bulk_import.iter_ndjson(request.stream())
+    else:
+        records = bulk_import.iter_json_array(request.stream())
+    importer = bulk_import.BulkImporter(db)
+    try:
+        await importer.run(records)
+    except bulk_import.BulkPayloadError as exc:
+        # Rows before the malformed part are already committed, so report them along with the error
+        return JSONResponse({**bulk_import.summarize(importer.results), "error": str(exc)}, status_code=400)
+    if importer.error is not None:
+        # Interrupted (hashing pool or database): committed rows are "created", the rest "failed"
+        return JSONResponse(
+            {**bulk_import.summarize(importer.results), "error": "Import interrupted, resend the failed rows"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    return bulk_import.summarize(importer.results)
+
+
+# Token endpoint
+@sync_routes.post("/token", response_model=schemas.Token, dependencies=[Depends(throttle_login)])
+async def login_for_access_token(background_tasks: BackgroundTasks, form_data: OAuth2PasswordRequestForm = Depends(),
+                                 db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password, background_tasks)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(
+        data=token_claims(user), expires_delta=access_token_expires
+    )
+    # Update last_login (written behind in batches by login_tracker)
+    login_tracker.buffer.record(user.user_id, user.username)
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+# Protected route example
+@sync_routes.get("/users/me", response_model=schemas.UserResponse)
+def read_users_me(current_user: schemas.UserResponse = Depends(get_current_user)):
+    return current_user
+
+
+# User listing/search with keyset pagination; format=ndjson streams the full result
+@app.get("/users", response_model=schemas.UserPage)
+def list_users(
+    limit: int = Query(50, ge=1, le=user_search.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: str = Query("user_id", pattern="^(user_id|date_created)$"),
+    username: Optional[str] = Query(None, description="Username prefix"),
+    email: Optional[str] = Query(None, description="Email prefix"),
+    last_login_after: Optional[datetime] = None,
+    last_login_before: Optional[datetime] = None,
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    admin: schemas.UserResponse = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    filters = user_search.UserFilter(username, email, last_login_after, last_login_before, order)
+    if output == "ndjson":
+        def export():
+            with database.read_only(db):
+                yield from user_search.export_ndjson(db, filters)
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+    try:
+        with database.read_only(db):
+            return user_search.fetch_page(db, filters, limit, cursor)
+    except user_search.InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Profiling results: hottest functions per route and the collapsed stacks of single requests
+@app.get("/debug/profiles")
+def read_profiles(top: int = Query(20, ge=1, le=200), admin: schemas.UserResponse = Depends(get_current_admin)):
+    return {"enabled": profiling.PROFILING_ENABLED, **profiling.profiler.summary(top)}
+
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+def read_profile(profile_id: str, admin: schemas.UserResponse = Depends(get_current_admin)):
+    folded = profiling.profiler.read(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return folded
+
+
+# Async database mode: the same endpoints on AsyncSession, no thread hop per request
+async def get_async_db():
+    try:
+        async with database.AsyncSessionLocal() as db:
+            yield db
+    except OperationalError:
+        logger.error("Database connection failed.")
+        raise HTTPException(status_code=503, detail="Database is unavailable")
+
+
+async def authenticate_user_async(db: "AsyncSession", username: str, password: str,
+                                  background_tasks: Optional[BackgroundTasks] = None):
+    user = await user_queries.get_user_credentials_async(db, username)
+    if not user:
+        return False
+    if not await hashing.verify_password(password, user.password_hash):
+        return False
+    schedule_rehash(user, password, background_tasks)
+    return user
+
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: "AsyncSession" = Depends(get_async_db)):
+    credentials_exception = credentials_error()
+
+    async def load_principal():
+        payload, token_data = decode_token(token, credentials_exception)
+        user = await user_queries.get_user_profile_async(db, token_data.username)
+        if user is None:
+            raise credentials_exception
+        return payload, schemas.UserResponse.model_validate(user), user.username
+
+    entry = await token_cache.cache.get_or_load_async(token, load_principal)
+    return entry.principal
+
+
+@async_routes.post("/register", response_model=schemas.UserResponse)
+async def register_async(user: schemas.UserCreate, db: "AsyncSession" = Depends(get_async_db)):
+    # One round trip for both uniqueness checks
+    username_taken, email_taken = await user_queries.find_taken_async(db, user.username, user.email)
+    if username_taken:
         raise HTTPException(status_code=400, detail="Username already registered")
-    db_email = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_email:
+    if email_taken:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await hashing.hash_password(user.password)
     new_user = models.User(
         username=user.username,
         password_hash=hashed_password,
@@ -118,18 +467,19 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     )
     db.add(new_user)
     try:
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
     except OperationalError:
         logger.error("Failed to commit new user to the database.")
         raise HTTPException(status_code=503, detail="Database is unavailable")
     return new_user
 
 
-# Token endpoint
-@app.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+@async_routes.post("/token", response_model=schemas.Token, dependencies=[Depends(throttle_login)])
+async def login_for_access_token_async(background_tasks: BackgroundTasks,
+                                       form_data: OAuth2PasswordRequestForm = Depends(),
+                                       db: "AsyncSession" = Depends(get_async_db)):
+    user = await authenticate_user_async(db, form_data.username, form_data.password, background_tasks)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -138,49 +488,118 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
-    # Update last_login
-    user.last_login = func.now()
-    try:
-        db.commit()
-    except OperationalError:
-        logger.error("Failed to update last_login due to database unavailability.")
-        raise HTTPException(status_code=503, detail="Database is unavailable")
+    login_tracker.buffer.record(user.user_id, user.username)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-# Protected route example
-@app.get("/users/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+@async_routes.get("/users/me", response_model=schemas.UserResponse)
+async def read_users_me_async(current_user: schemas.UserResponse = Depends(get_current_user_async)):
     return current_user
 
+
+app.include_router(async_routes if database.DB_ASYNC else sync_routes)
+
+# Library service (books/authors over REST and GraphQL)
+app.include_router(library.router)
+
+# Liveness: the process is up and serving, no database access
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+@app.get("/health/live")
+def health_check():
     return {"status": "ok"}
 
 
+# Readiness: answered from the cached background DB ping
+@app.get("/health/ready")
+def readiness_check():
+    result = health.probe.status()
+    if not result["ready"]:
+        return JSONResponse(status_code=503, content={"status": "unavailable", **result})
+    return {"status": "ok", **result}
+
+
+@app.get("/health/pool")
+def pool_stats():
+    return {
+        "settings": database.pool_settings(),
+        "status": database.pool_status(engine),
+        "replicas": database.replicas.status(),
+    }
+
+
+# Cold-start timings (imports, app setup and each lifespan step)
+@app.get("/health/startup")
+def startup_report():
+    return startup.report.as_dict()
+
+
+# Public signing keys so other services can verify tokens locally
+@app.get("/.well-known/jwks.json")
+def read_jwks(request: Request):
+    body = auth.keyring.jwks()
+    etag = auth.keyring.jwks_etag
+    headers = {
+        "Cache-Control": f"public, max-age={auth.JWKS_MAX_AGE_SECONDS}",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Metrics in Prometheus text exposition format
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Home route
 @app.get("/")
 def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
-
-
-# Startup event to create tables
-@app.on_event("startup")
-def startup_event():
-    try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully.")
-    except OperationalError:
-        logger.error("Could not connect to the database. Tables were not created.")
+    return rendered_templates.respond(request, "index.html")
 
 
 # Optional: Global exception handler for database errors
 @app.exception_handler(OperationalError)
 async def db_exception_handler(request: Request, exc: OperationalError):
-    logger.error(f"Database error: {exc}")
+    logger.error("Database error: %s", exc)
     return JSONResponse(
         status_code=503,
         content={"detail": "Database is unavailable"},
     )
+
+
+# Reject hashing work early when the pool is saturated instead of queueing without bound
+@app.exception_handler(hashing.HashingQueueFull)
+async def hashing_queue_full_handler(request: Request, exc: hashing.HashingQueueFull):
+    logger.warning("Hashing queue full, rejecting %s", request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(hashing.HashingUnavailable)
+async def hashing_unavailable_handler(request: Request, exc: hashing.HashingUnavailable):
+    logger.error("Hashing workers unavailable for %s", request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+# Too many login attempts: answered without touching the database or the hashing pool
+@app.exception_handler(rate_limit.RateLimited)
+async def rate_limited_handler(request: Request, exc: rate_limit.RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many login attempts, please retry later"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+startup.report.mark("app_setup")
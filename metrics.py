@@ -0,0 +1,291 @@
+# metrics.py
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # Optional callback returning {labels_tuple: value}, evaluated at scrape time
+        self.callback = callback
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        values = self.callback() if self.callback is not None else self._values
+        lines = self.header()
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            snapshot = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled by route.", ("method", "route")
+)
+
+# SQL
+db_statement_duration = registry.histogram(
+    "db_statement_duration_seconds", "SQL statement execution time by statement type.", ("engine", "statement")
+)
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",)
+)
+
+# Password hashing
+hash_duration = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify compute time in the worker.", ("operation",)
+)
+hash_total_duration = registry.histogram(
+    "password_hash_call_duration_seconds", "bcrypt call time including queueing.", ("operation",)
+)
+
+
+def observe_hashing(operation: str, total: float, compute: float):
+    hash_duration.observe(operation, value=compute)
+    hash_total_duration.observe(operation, value=total)
+
+
+def _match_route(routes, scope):
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            # Newer FastAPI versions keep included routers as a single nested route
+            nested = getattr(route, "original_router", None)
+            if nested is not None:
+                return _match_route(nested.routes, scope)
+            return getattr(route, "path", None)
+    return None
+
+
+def route_label(app, scope) -> str:
+    """Path template of the route ``scope`` matches in ``app``, or ``unmatched``."""
+    return _match_route(app.router.routes, scope) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests.
+
+    Routes are labelled by their path template (``/users/me``, ``/static``), unmatched
+    paths share the ``unmatched`` label to keep cardinality bounded.
+    """
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        self.routes_app = routes_app
+
+    def _route_label(self, scope) -> str:
+        return route_label(self.routes_app, scope)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = self._route_label(scope)
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec(method, route)
+            http_request_duration.observe(
+                method, route, str(status_code[0]), value=time.perf_counter() - started
+            )
+
+
+def _statement_type(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "EMPTY"
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Attach statement timing, checkout wait and pool gauges to a SQLAlchemy engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append((statement, time.perf_counter()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info["metrics_query_start"].pop()
+        db_statement_duration.observe(name, _statement_type(statement), value=time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # A failed statement gets no after_cursor_execute; drop its start so the stack of the
+        # (pooled, reused) connection stays balanced
+        conn = exception_context.connection
+        starts = conn.info.get("metrics_query_start") if conn is not None else None
+        if starts and starts[-1][0] == exception_context.statement:
+            starts.pop()
+
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        connection = raw_connection()
+        db_pool_checkout_wait.observe(name, value=time.perf_counter() - started)
+        return connection
+
+    engine.raw_connection = timed_raw_connection
+
+    _instrumented_engines[name] = engine
+
+
+def _pool_stats():
+    stats = {}
+    for name, engine in _instrumented_engines.items():
+        for state in ("size", "checkedin", "checkedout", "overflow"):
+            getter = getattr(engine.pool, state, None)
+            if callable(getter):
+                stats[(name, state)] = getter()
+    return stats
+
+
+_instrumented_engines = {}
+db_pool_connections = registry.gauge(
+    "db_pool_connections", "Connection pool state by engine.", ("engine", "state"), callback=_pool_stats
+)
@@ -0,0 +1,40 @@
+"""Create the User table
+
+Existing databases that already have it (created by create_all) are marked with
+``alembic stamp 0001`` instead.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-10-24 08:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "User",
+        sa.Column("user_id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("username", sa.String(length=50), nullable=False),
+        sa.Column("password_hash", sa.String(length=255), nullable=False),
+        sa.Column("email", sa.String(length=100), nullable=False),
+        sa.Column("first_name", sa.String(length=50), nullable=True),
+        sa.Column("last_name", sa.String(length=50), nullable=True),
+        sa.Column("date_created", sa.DateTime(timezone=True), server_default=sa.func.now(),
+                  nullable=True),
+        sa.Column("last_login", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index("ix_User_user_id", "User", ["user_id"])
+    op.create_index("ix_User_username", "User", ["username"], unique=True)
+    op.create_index("ix_User_email", "User", ["email"], unique=True)
+
+
+def downgrade():
+    op.drop_table("User")
@@ -0,0 +1,23 @@
+"""Composite indexes for the user listing (keyset pagination, last_login filters)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:00:00
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_User_date_created_user_id", "User", ["date_created", "user_id"])
+    op.create_index("ix_User_last_login_user_id", "User", ["last_login", "user_id"])
+
+
+def downgrade():
+    op.drop_index("ix_User_last_login_user_id", table_name="User")
+    op.drop_index("ix_User_date_created_user_id", table_name="User")
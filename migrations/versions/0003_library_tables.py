@@ -0,0 +1,49 @@
+"""Create the library tables (Book, Author, BookAuthor)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:05:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "Book",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("publication_year", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_Book_id", "Book", ["id"])
+    op.create_table(
+        "Author",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("birthdate", sa.String(length=10), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_Author_id", "Author", ["id"])
+    op.create_table(
+        "BookAuthor",
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["book_id"], ["Book.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["author_id"], ["Author.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("book_id", "author_id"),
+    )
+    op.create_index("ix_BookAuthor_author_id", "BookAuthor", ["author_id"])
+
+
+def downgrade():
+    op.drop_table("BookAuthor")
+    op.drop_table("Author")
+    op.drop_table("Book")
@@ -1,5 +1,6 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, DateTime, Table, Text
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
@@ -14,3 +15,35 @@ class User(Base):
     last_name = Column(String(50), nullable=True)
     date_created = Column(DateTime(timezone=True), server_default=func.now())
     last_login = Column(DateTime(timezone=True), nullable=True)
+
+    # Keyset pagination and last_login range filters in the user listing
+    __table_args__ = (
+        Index("ix_User_date_created_user_id", "date_created", "user_id"),
+        Index("ix_User_last_login_user_id", "last_login", "user_id"),
+    )
+
+
+# Library (see Uebung5/openapi.yaml and Uebung5/schema.graphql)
+book_authors = Table(
+    "BookAuthor",
+    Base.metadata,
+    Column("book_id", Integer, ForeignKey("Book.id", ondelete="CASCADE"), primary_key=True),
+    Column("author_id", Integer, ForeignKey("Author.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+class Book(Base):
+    __tablename__ = "Book"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    publication_year = Column(Integer, nullable=True)
+    authors = relationship("Author", secondary=book_authors, back_populates="books")
+
+class Author(Base):
+    __tablename__ = "Author"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    name = Column(String(100), nullable=False)
+    birthdate = Column(String(10), nullable=True)
+    books = relationship("Book", secondary=book_authors, back_populates="authors")
@@ -0,0 +1,68 @@
+# password_upgrade.py
+import logging
+
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+import auth
+import hashing
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordUpgrader:
+    """Rehashes a password after a successful login when its hash is weaker than the current cost.
+
+    Runs as a background task after the response is sent. The stored hash is only replaced
+    if it is still the one that was verified, so a password changed in the meantime wins.
+    If the hashing pool is busy the upgrade is skipped and retried on the next login.
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self._in_progress = set()
+        # Metrics
+        self.results = {"upgraded": 0, "skipped": 0, "failed": 0}
+
+    def needs_upgrade(self, user_id: int, hashed_password: str) -> bool:
+        return user_id not in self._in_progress and auth.password_needs_update(hashed_password)
+
+    async def upgrade(self, user_id: int, password: str, old_hash: str):
+        if user_id in self._in_progress:
+            return
+        self._in_progress.add(user_id)
+        try:
+            new_hash = await hashing.hash_password(password)
+            written = await run_in_threadpool(self._write, user_id, old_hash, new_hash)
+            self.results["upgraded" if written else "skipped"] += 1
+        except (hashing.HashingQueueFull, hashing.HashingUnavailable):
+            self.results["skipped"] += 1
+        except SQLAlchemyError as exc:
+            self.results["failed"] += 1
+            logger.error("Failed to store the upgraded password hash of user %s: %s", user_id, exc)
+        finally:
+            self._in_progress.discard(user_id)
+
+    def _write(self, user_id: int, old_hash: str, new_hash: str) -> bool:
+        if self.session_factory is None:
+            from database import SessionLocal
+            self.session_factory = SessionLocal
+        # Core update, so token_cache is not invalidated; cached principals hold no password hash
+        statement = (
+            update(models.User)
+            .where(models.User.user_id == user_id, models.User.password_hash == old_hash)
+            .values(password_hash=new_hash)
+            .execution_options(synchronize_session=False)
+        )
+        db = self.session_factory()
+        try:
+            written = db.execute(statement).rowcount
+            db.commit()
+        finally:
+            db.close()
+        return written == 1
+
+
+upgrader = PasswordUpgrader()
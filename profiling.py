@@ -0,0 +1,260 @@
+# profiling.py
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import anyio.to_thread
+from jose import JWTError
+
+import auth
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")  # Off: no middleware
+PROFILING_HEADER = os.getenv("PROFILING_HEADER", "X-Profile")  # Set to 1 by an admin to profile one request
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))  # Share of all requests profiled
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")  # <id>.folded files, one per profiled request
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class RequestProfile:
+    """Stack samples of one request: its asyncio task on the event loop plus the worker threads it runs in."""
+
+    def __init__(self, profile_id: str, route: str):
+        self.id = profile_id
+        self.route = route
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.threads = set()
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def folded(self) -> str:
+        """Collapsed stacks (``frame;frame;frame count``), the input format of flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Samples the stacks of profiled requests from a background thread.
+
+    The thread only runs while at least one request is being profiled. Event loop samples
+    are kept only while the request's own task is running, so concurrent requests do not
+    mix. Sync handlers and dependencies are followed into the thread pool by wrapping
+    ``anyio.to_thread.run_sync`` (the call behind ``run_in_threadpool``) once enabled.
+    """
+
+    def __init__(self, directory: str = PROFILING_DIR, interval_ms: float = PROFILING_INTERVAL_MS,
+                 max_files: int = PROFILING_MAX_FILES):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._active = set()
+        self._thread = None
+        self._ids = itertools.count(1)
+        self._files = []
+        self._original_run_sync = None
+        self.routes = {}  # route -> {"requests", "samples", "self", "total"}
+
+    def install(self):
+        """Follow profiled requests into worker threads; a no-op wrapper for everything else."""
+        if self._original_run_sync is not None:
+            return
+        run_sync = self._original_run_sync = anyio.to_thread.run_sync
+
+        async def profiled_run_sync(func, *args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await run_sync(func, *args, **kwargs)
+
+            def run_in_thread(*call_args):
+                ident = threading.get_ident()
+                profile.threads.add(ident)
+                try:
+                    return func(*call_args)
+                finally:
+                    profile.threads.discard(ident)
+
+            return await run_sync(run_in_thread, *args, **kwargs)
+
+        anyio.to_thread.run_sync = profiled_run_sync
+
+    def uninstall(self):
+        """Restore the original ``anyio.to_thread.run_sync``."""
+        if self._original_run_sync is not None:
+            anyio.to_thread.run_sync = self._original_run_sync
+            self._original_run_sync = None
+
+    def start(self, route: str) -> RequestProfile:
+        profile = RequestProfile(f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._ids)}", route)
+        _current_profile.set(profile)
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def finish(self, profile: RequestProfile):
+        profile.duration = time.perf_counter() - profile.started
+        _current_profile.set(None)
+        with self._lock:
+            # Samples are only added under the lock while active, so the stacks are final here
+            self._active.discard(profile)
+            summary = self.routes.setdefault(
+                profile.route, {"requests": 0, "samples": 0, "self": Counter(), "total": Counter()}
+            )
+            summary["requests"] += 1
+            for stack, count in profile.stacks.items():
+                frames = stack.split(";")
+                summary["samples"] += count
+                summary["self"][frames[-1]] += count
+                for frame in set(frames):
+                    summary["total"][frame] += count
+        self._write(profile)
+
+    def _sample(self):
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+        while True:
+            # One sampling pass under the lock: finish() waits for a pass in progress, and sees
+            # its samples, instead of iterating the stacks while they are being added to
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for profile in self._active:
+                    threads = set(profile.threads)
+                    if current_tasks is None or current_tasks.get(profile.loop) is profile.task:
+                        threads.add(profile.loop_thread)
+                    for ident in threads:
+                        frame = frames.get(ident)
+                        if frame is not None:
+                            profile.stacks[_collapse(frame)] += 1
+                del frames
+            time.sleep(self.interval)
+
+    def _write(self, profile: RequestProfile):
+        if not profile.stacks:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile.id}.folded"), "w") as handle:
+                handle.write(profile.folded())
+        except OSError as exc:
+            logger.error("Could not write profile %s: %s", profile.id, exc)
+            return
+        with self._lock:
+            self._files.append(profile.id)
+            expired, self._files = self._files[:-self.max_files], self._files[-self.max_files:]
+        for profile_id in expired:
+            try:
+                os.remove(os.path.join(self.directory, f"{profile_id}.folded"))
+            except OSError:
+                pass
+
+    def read(self, profile_id: str):
+        if profile_id not in self._files:
+            return None
+        with open(os.path.join(self.directory, f"{profile_id}.folded")) as handle:
+            return handle.read()
+
+    def summary(self, top: int = 20) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "requests": data["requests"],
+                    "samples": data["samples"],
+                    "hottest": [
+                        {"function": function, "self_samples": count, "total_samples": data["total"][function]}
+                        for function, count in data["self"].most_common(top)
+                    ],
+                }
+                for route, data in self.routes.items()
+            }
+            return {"interval_ms": self.interval * 1000, "routes": routes, "profiles": list(self._files)}
+
+
+profiler = Profiler()
+
+
+def _is_admin(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                return auth.decode_access_token(token).get("sub") in auth.ADMIN_USERNAMES
+            except JWTError:
+                return False
+    return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that carry ``header: 1`` from an admin, or a random sample.
+
+    Only installed when PROFILING_ENABLED is set. Profiled responses carry ``X-Profile-Id``;
+    the collapsed stacks are written to ``PROFILING_DIR`` and summarized per route.
+    """
+
+    def __init__(self, app, routes_app=None, profiler: Profiler = profiler, header: str = PROFILING_HEADER,
+                 sample_rate: float = PROFILING_SAMPLE_RATE):
+        self.app = app
+        self.routes_app = routes_app
+        self.profiler = profiler
+        self.header = header.lower().encode()
+        self.sample_rate = sample_rate
+        profiler.install()
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self.header:
+                return value == b"1" and _is_admin(scope)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            self._requested(scope) or (self.sample_rate and random.random() < self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(metrics.route_label(self.routes_app, scope))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.finish(profile)
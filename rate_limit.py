@@ -0,0 +1,205 @@
+# rate_limit.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+LOGIN_RATE_LIMIT_ENABLED = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))  # Attempts a client IP can make at once
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "20"))  # Sustained attempts per IP
+LOGIN_USERNAME_BURST = int(os.getenv("LOGIN_USERNAME_BURST", "5"))
+LOGIN_USERNAME_PER_MINUTE = float(os.getenv("LOGIN_USERNAME_PER_MINUTE", "5"))
+LOGIN_RATE_STORE = os.getenv("LOGIN_RATE_STORE", "memory")  # memory (per process) or sqlite (shared)
+LOGIN_RATE_SQLITE_PATH = os.getenv("LOGIN_RATE_SQLITE_PATH", "rate_limit.db")
+LOGIN_RATE_MAX_BUCKETS = int(os.getenv("LOGIN_RATE_MAX_BUCKETS", "100000"))
+LOGIN_RATE_SWEEP_SECONDS = float(os.getenv("LOGIN_RATE_SWEEP_SECONDS", "60"))
+
+
+class RateLimited(Exception):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Too many login attempts ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class Limit:
+    """Token bucket parameters: ``burst`` tokens, refilled at ``per_minute`` tokens per minute."""
+
+    __slots__ = ("burst", "rate")
+
+    def __init__(self, burst: int, per_minute: float):
+        # A bucket that never refills would lock a client out for good (and Retry-After: inf)
+        if burst < 1 or per_minute <= 0:
+            raise ValueError(f"Invalid rate limit: burst {burst} must be >= 1 and per_minute {per_minute} > 0")
+        self.burst = burst
+        self.rate = per_minute / 60
+
+    @property
+    def idle_seconds(self) -> float:
+        # After this long without attempts a bucket is full again, i.e. equal to a new one
+        return self.burst / self.rate
+
+    def refill(self, tokens: float, updated: float, now: float) -> float:
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait(self, tokens: float, cost: float = 1) -> float:
+        return (cost - tokens) / self.rate
+
+
+class MemoryStore:
+    """Buckets of this process in an LRU dict; idle (refilled) buckets are swept out."""
+
+    def __init__(self, max_buckets: int = LOGIN_RATE_MAX_BUCKETS, sweep_seconds: float = LOGIN_RATE_SWEEP_SECONDS):
+        self.max_buckets = max_buckets
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> [tokens, updated, idle_seconds]
+        self._swept_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, requests) -> tuple:
+        """Take one token from every ``(key, limit)`` bucket, or from none of them.
+
+        Returns ``(None, 0)`` if allowed, otherwise ``(key, retry_after)`` of the most limiting bucket.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at >= self.sweep_seconds:
+                self._sweep(now)
+            state = []
+            for key, limit in requests:
+                bucket = self._buckets.get(key)
+                tokens = limit.burst if bucket is None else limit.refill(bucket[0], bucket[1], now)
+                state.append((key, limit, tokens))
+            denied = [(limit.wait(tokens), key) for key, limit, tokens in state if tokens < 1]
+            if denied:
+                retry_after, key = max(denied)
+                return key, retry_after
+            for key, limit, tokens in state:
+                self._buckets[key] = [tokens - 1, now, limit.idle_seconds]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return None, 0
+
+    def _sweep(self, now: float):
+        idle = [key for key, (_, updated, idle_seconds) in self._buckets.items() if now - updated >= idle_seconds]
+        for key in idle:
+            del self._buckets[key]
+        self._swept_at = now
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteStore:
+    """Buckets in a SQLite file so that all workers on a host share them.
+
+    Each acquire is one ``BEGIN IMMEDIATE`` transaction, which serializes concurrent workers.
+    Wall-clock time is used because monotonic clocks are not comparable between processes.
+    """
+
+    def __init__(self, path: str = LOGIN_RATE_SQLITE_PATH, sweep_seconds: float = LOGIN_RATE_SWEEP_SECONDS):
+        self.path = path
+        self.sweep_seconds = sweep_seconds
+        self._local = threading.local()
+        self._swept_at = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS login_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_login_buckets_expires ON login_buckets (expires)")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM login_buckets").fetchone()[0]
+
+    def acquire(self, requests) -> tuple:
+        now = time.time()
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if now - self._swept_at >= self.sweep_seconds:
+                connection.execute("DELETE FROM login_buckets WHERE expires <= ?", (now,))
+                self._swept_at = now
+            state = []
+            for key, limit in requests:
+                row = connection.execute("SELECT tokens, updated FROM login_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = limit.burst if row is None else limit.refill(row[0], row[1], now)
+                state.append((key, limit, tokens))
+            denied = [(limit.wait(tokens), key) for key, limit, tokens in state if tokens < 1]
+            if denied:
+                connection.execute("ROLLBACK")
+                retry_after, key = max(denied)
+                return key, retry_after
+            connection.executemany(
+                "INSERT OR REPLACE INTO login_buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?)",
+                [(key, tokens - 1, now, now + limit.idle_seconds) for key, limit, tokens in state],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        return None, 0
+
+    def clear(self):
+        self._connect().execute("DELETE FROM login_buckets")
+
+
+class LoginThrottle:
+    """Per-IP and per-username token buckets, checked before a password is hashed.
+
+    An attempt takes a token from both buckets or, if either is empty, from neither and
+    fails with ``RateLimited`` carrying the time until the next token is available.
+    """
+
+    def __init__(self, store=None, ip_limit: Limit = None, username_limit: Limit = None,
+                 enabled: bool = LOGIN_RATE_LIMIT_ENABLED):
+        self.store = store
+        self.ip_limit = ip_limit or Limit(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+        self.username_limit = username_limit or Limit(LOGIN_USERNAME_BURST, LOGIN_USERNAME_PER_MINUTE)
+        self.enabled = enabled
+        self.throttled = {"ip": 0, "username": 0}
+
+    def _store(self):
+        if self.store is None:
+            self.store = SQLiteStore() if LOGIN_RATE_STORE == "sqlite" else MemoryStore()
+        return self.store
+
+    def check(self, client_ip: str, username: str):
+        if not self.enabled:
+            return
+        requests = [(f"ip:{client_ip}", self.ip_limit)]
+        if username:
+            requests.append((f"user:{username.casefold()}", self.username_limit))
+        key, retry_after = self._store().acquire(requests)
+        if key is not None:
+            scope = key.partition(":")[0].replace("user", "username")
+            self.throttled[scope] += 1
+            logger.warning("Login throttled by %s bucket for %s", scope, client_ip)
+            raise RateLimited(scope, retry_after)
+
+    @property
+    def buckets(self) -> int:
+        return len(self.store) if self.store is not None else 0
+
+
+throttle = LoginThrottle()
@@ -1,6 +1,6 @@
 # schemas.py
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -20,9 +20,40 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True  # Updated from orm_mode
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+
+
+# Library schemas (field names follow Uebung5/openapi.yaml)
+class AuthorInput(BaseModel):
+    name: str
+    birthdate: Optional[str] = None
+
+class BookInput(BaseModel):
+    title: str
+    description: Optional[str] = None
+    publicationYear: Optional[int] = None
+    authors: List[str] = []
+
+class AuthorSummary(AuthorInput):
+    id: str
+
+class BookSummary(BaseModel):
+    id: str
+    title: str
+    description: Optional[str] = None
+    publicationYear: Optional[int] = None
+
+class Book(BookSummary):
+    authors: List[AuthorSummary] = []
+
+class Author(AuthorSummary):
+    books: List[BookSummary] = []
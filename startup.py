@@ -0,0 +1,51 @@
+# startup.py
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Timings of the cold start: module imports, then each lifespan step until ready.
+
+    Created when this module is imported, which ``main`` does first, so ``imports``
+    covers loading the rest of the application.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.total = None
+        self._mark = self.started
+
+    def mark(self, name: str):
+        """Record the time since the previous mark (or phase) as ``name``."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases[name] = now - started
+            self._mark = now
+
+    def ready(self):
+        self.total = time.perf_counter() - self.started
+        logger.info("Started in %.0f ms (%s)", self.total * 1000,
+                    ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items()))
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.total is not None,
+            "total_seconds": self.total,
+            "phases": dict(self.phases),
+        }
+
+
+report = StartupReport()
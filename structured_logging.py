@@ -0,0 +1,264 @@
+# structured_logging.py
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Configuration variables
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "logs/app-{pid}.jsonl")  # NDJSON, one file per worker process; empty disables
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "true").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records beyond this are dropped, never waited for
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "DEBUG=1,INFO=1")  # Share of records kept per level
+LOG_ACCESS_SAMPLE_RATE = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "1"))  # 5xx responses are always logged
+LOG_REPEAT_LIMIT = int(os.getenv("LOG_REPEAT_LIMIT", "20"))  # Same warning/error message per window
+LOG_REPEAT_WINDOW_SECONDS = float(os.getenv("LOG_REPEAT_WINDOW_SECONDS", "60"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._-]{1,64}$")
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+request_id = contextvars.ContextVar("request_id", default=None)
+access_logger = logging.getLogger("access")
+
+# Counters of records that were not written
+stats = {"sampled": 0, "rate_limited": 0, "queue_full": 0}
+
+
+def _parse_rates(value: str) -> dict:
+    rates = {}
+    for part in value.split(","):
+        level, _, rate = part.partition("=")
+        if level.strip() and rate.strip():
+            rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the records per level (e.g. 1% of DEBUG); levels without a rate are all kept."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1)
+        if rate < 1 and random.random() >= rate:
+            stats["sampled"] += 1
+            return False
+        return True
+
+
+class RepeatLimitFilter(logging.Filter):
+    """Caps identical warnings/errors (same logger and message template) at ``limit`` per window.
+
+    The first record after a window with suppressed repeats carries ``suppressed``.
+    """
+
+    def __init__(self, limit: int = LOG_REPEAT_LIMIT, window: float = LOG_REPEAT_WINDOW_SECONDS,
+                 level: int = logging.WARNING, max_keys: int = 1000):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.level = level
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._windows = {}  # key -> [window start, count, suppressed]
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                if state is None and len(self._windows) >= self.max_keys:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            state[1] += 1
+            if state[1] <= self.limit:
+                return True
+            state[2] += 1
+        stats["rate_limited"] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread, dropping them when the queue is full.
+
+    The queue is in-process, so records need not be pickled, but they are written later by
+    another thread: the message is rendered now, while its arguments still hold the values
+    they had when logging, and the traceback is rendered to text so the record keeps no
+    frames (and the request objects they reference) alive. JSON and console formatting
+    stay on the listener.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["queue_full"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for name, value in vars(record).items():
+            if name not in _STANDARD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        rid = getattr(record, "request_id", None)
+        return f"{line} [{rid}]" if rid else line
+
+
+_listener = None
+
+
+def configure(level: str = LOG_LEVEL, log_file: str = LOG_FILE, console: bool = LOG_CONSOLE):
+    """Route the root logger through a bounded queue to a background writer (rotating NDJSON file, console).
+
+    ``{pid}`` in ``log_file`` is replaced by the process ID: uvicorn workers must not share a
+    file, as each would rotate it independently.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    handlers = []
+    if log_file:
+        log_file = log_file.replace("{pid}", str(os.getpid()))
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(SamplingFilter(_parse_rates(LOG_SAMPLE_RATES)))
+    queue_handler.addFilter(RepeatLimitFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """Write out everything still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handler in list(logging.getLogger().handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                logging.getLogger().removeHandler(handler)
+
+
+def _request_id(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == REQUEST_ID_HEADER and _VALID_REQUEST_ID.match(value):
+            return value.decode()
+    return uuid.uuid4().hex
+
+
+class AccessLogMiddleware:
+    """ASGI middleware assigning a request ID and writing one structured access record per request.
+
+    An incoming ``X-Request-ID`` is reused, otherwise one is generated; it is returned in the
+    response and attached to every log record emitted while handling the request.
+    """
+
+    def __init__(self, app, sample_rate: float = LOG_ACCESS_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = _request_id(scope)
+        token = request_id.set(rid)
+        status_code = [500]
+        header = (REQUEST_ID_HEADER, rid.encode())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if status_code[0] >= 500 or self.sample_rate >= 1 or random.random() < self.sample_rate:
+                client = scope.get("client")
+                access_logger.info(
+                    "%s %s %s", scope["method"], scope["path"], status_code[0],
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code[0],
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                        "client": client[0] if client else None,
+                    },
+                )
+            request_id.reset(token)
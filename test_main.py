@@ -1,9 +1,24 @@
+import json
+import os
+import time
+import tempfile
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from database import Base
 from main import app, get_db
+import auth
+import hashing
+import health
+import login_tracker
+import metrics
+import models
+import password_upgrade
+import rate_limit
+import token_cache
+import user_search
 
 # Erstelle eine Testdatenbank (SQLite)
 DATABASE_URL = "sqlite:///./test.db"
@@ -20,6 +35,10 @@ def get_test_db():
 
 # Anwenden der Überschreibung
 app.dependency_overrides[get_db] = get_test_db
+login_tracker.buffer.session_factory = TestingSessionLocal
+password_upgrade.upgrader.session_factory = TestingSessionLocal
+health.probe.engine = engine
+auth.keyring.directory = tempfile.mkdtemp()
 
 # Erstelle die Tabellen in der Testdatenbank
 Base.metadata.create_all(bind=engine)
@@ -30,10 +49,22 @@ client = TestClient(app)
 def setup_db():
     # Tabellen erstellen
     Base.metadata.create_all(bind=engine)
+    token_cache.cache.clear()
+    rate_limit.throttle.store = rate_limit.MemoryStore()
     yield
     # Tabellen nach dem Test löschen
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def admin_headers(setup_db):
+    # Registriert den Benutzer "admin" und meldet ihn als Administrator an
+    client.post("/register", json={"username": "admin", "email": "admin@example.com", "password": "password123"})
+    token = client.post("/token", data={"username": "admin", "password": "password123"}).json()["access_token"]
+    auth.ADMIN_USERNAMES.add("admin")
+    yield {"Authorization": f"Bearer {token}"}
+    auth.ADMIN_USERNAMES.discard("admin")
+    login_tracker.buffer.flush()
+
 # Verbesserte Dokumentation und erweiterte Testfälle
 
 # Testfälle für die Registrierung
@@ -159,6 +190,128 @@ def test_login_user_invalid_password(setup_db):
     assert response.status_code == 401
     assert response.json()["detail"] == "Incorrect username or password"
 
+def test_login_throttled_before_hashing(setup_db, monkeypatch):
+    """
+    Testet, dass nach zu vielen Versuchen für einen Benutzernamen 429 mit Retry-After kommt,
+    ohne dass das Passwort gehasht wird.
+    """
+    hashed = []
+
+    async def fake_verify(password, password_hash):
+        hashed.append(password)
+        return False
+
+    monkeypatch.setattr(hashing, "verify_password", fake_verify)
+    monkeypatch.setattr(rate_limit.throttle, "username_limit", rate_limit.Limit(2, 1))
+    client.post("/register", json={
+        "username": "throttled",
+        "email": "throttled@example.com",
+        "password": "password123",
+        "first_name": "Test",
+        "last_name": "User"
+    })
+    statuses = [
+        client.post("/token", data={"username": "throttled", "password": "wrong"}).status_code
+        for _ in range(3)
+    ]
+    assert statuses == [401, 401, 429]
+    assert len(hashed) == 2
+    response = client.post("/token", data={"username": "Throttled", "password": "wrong"})
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+def test_rate_limit_rejects_non_positive_rates():
+    """
+    Testet, dass Limits ohne Nachfüllrate (oder ohne Burst) beim Start abgelehnt werden.
+    """
+    with pytest.raises(ValueError):
+        rate_limit.Limit(5, 0)
+    with pytest.raises(ValueError):
+        rate_limit.Limit(0, 5)
+    assert rate_limit.Limit(2, 30).wait(0) == 2
+
+def test_sqlite_rate_store_shared_and_evicted(tmp_path):
+    """
+    Testet, dass sich zwei Worker die Buckets in SQLite teilen und volle Buckets entfernt werden.
+    """
+    path = str(tmp_path / "buckets.db")
+    first, second = rate_limit.SQLiteStore(path), rate_limit.SQLiteStore(path)
+    limit = rate_limit.Limit(2, 60)
+    assert first.acquire([("ip:1.2.3.4", limit)]) == (None, 0)
+    assert second.acquire([("ip:1.2.3.4", limit)]) == (None, 0)
+    key, retry_after = first.acquire([("ip:1.2.3.4", limit)])
+    assert key == "ip:1.2.3.4" and 0 < retry_after <= 1
+    second._connect().execute("UPDATE login_buckets SET expires = 0")
+    second.sweep_seconds = 0
+    assert second.acquire([("ip:5.6.7.8", limit)]) == (None, 0)
+    assert len(first) == 1
+
+def test_login_rehashes_outdated_password_hash(setup_db):
+    """
+    Testet, dass ein Hash mit zu geringen Kosten nach dem Login im Hintergrund ersetzt wird,
+    auch in den Worker-Prozessen mit den kalibrierten Einstellungen.
+    """
+    from passlib.context import CryptContext
+
+    db = TestingSessionLocal()
+    db.add(models.User(username="olduser", email="olduser@example.com", first_name="Old", last_name="User",
+                       password_hash=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")))
+    db.commit()
+    db.close()
+    auth.configure_password_hashing({"scheme": "bcrypt", "rounds": 5})
+    hashing.pool.reload()
+    try:
+        response = client.post("/token", data={"username": "olduser", "password": "password123"})
+        assert response.status_code == 200
+        db = TestingSessionLocal()
+        stored = db.query(models.User).filter(models.User.username == "olduser").first().password_hash
+        db.close()
+        assert stored.startswith("$2b$05$")
+        assert not auth.password_needs_update(stored)
+        assert client.post("/token", data={"username": "olduser", "password": "password123"}).status_code == 200
+        assert password_upgrade.upgrader.results["upgraded"] == 1
+    finally:
+        auth.configure_password_hashing(None)
+        hashing.pool.reload()
+
+def test_calibrated_bcrypt_cost_within_bounds():
+    """
+    Testet, dass die Kalibrierung die Runden an das Zeitbudget anpasst und die Grenzen einhält.
+    """
+    import hash_cost
+
+    assert hash_cost.calibrate_bcrypt(target_ms=1, samples=1)["rounds"] == hash_cost.BCRYPT_MIN_ROUNDS
+    assert hash_cost.calibrate_bcrypt(target_ms=10 ** 7, samples=1)["rounds"] == hash_cost.BCRYPT_MAX_ROUNDS
+
+def test_hash_cost_calibrated_once_per_host(monkeypatch, tmp_path):
+    """
+    Testet, dass nur der erste Worker kalibriert und alle anderen die gespeicherten Kosten übernehmen.
+    """
+    import hash_cost
+
+    cache_file = str(tmp_path / "hash_cost.json")
+    calls = []
+
+    def fake_calibrate():
+        calls.append(1)
+        return {"scheme": "bcrypt", "rounds": 12 + len(calls)}
+
+    monkeypatch.setattr(hash_cost, "PASSWORD_HASH_CACHE_FILE", cache_file)
+    monkeypatch.setattr(hash_cost, "PASSWORD_HASH_CALIBRATE", True)
+    monkeypatch.setattr(hash_cost, "BCRYPT_ROUNDS", None)
+    monkeypatch.setattr(hash_cost, "calibrate", fake_calibrate)
+    try:
+        assert hash_cost.configure() == {"scheme": "bcrypt", "rounds": 13}
+        assert hash_cost.configure() == {"scheme": "bcrypt", "rounds": 13}
+        assert len(calls) == 1
+        # Ein gleichzeitig kalibrierender Worker übernimmt die Kosten des ersten
+        assert hash_cost.store_cached({"scheme": "bcrypt", "rounds": 14}, cache_file)["rounds"] == 13
+        monkeypatch.setattr(hash_cost, "BCRYPT_ROUNDS", "11")
+        assert hash_cost.configure() == {"scheme": "bcrypt", "rounds": 11}
+        assert len(calls) == 1
+    finally:
+        auth.configure_password_hashing(None)
+
 # Tests für den geschützten Endpunkt `/users/me`
 def test_read_users_me_success(setup_db):
     """
@@ -207,6 +360,150 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
 
+def test_readiness_check():
+    """
+    Testet, dass `/health/ready` den zwischengespeicherten Datenbank-Ping auswertet.
+    """
+    assert health.probe.check_now()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["database"] == "ok"
+
+def test_readiness_check_stale_result():
+    """
+    Testet, dass ein veraltetes Ping-Ergebnis als nicht bereit gemeldet wird.
+    """
+    probe = health.DatabaseProbe(engine=engine, max_staleness=0)
+    probe._stopping.set()
+    probe.check_now()
+    result = probe.status()
+    assert result["ready"] is False
+    assert result["error"] == "stale result"
+
+def test_pool_stats():
+    """
+    Testet, dass `/health/pool` die Pool-Einstellungen und den Status liefert.
+    """
+    response = client.get("/health/pool")
+    assert response.status_code == 200
+    assert "pool_size" in response.json()["settings"]
+
+# Test für das Routing auf Read-Replicas (zwei SQLite-Dateien als Primary und Replica)
+def test_replica_routing(tmp_path):
+    """
+    Testet, dass Lesezugriffe im read_only-Block auf die Replica gehen, Schreibzugriffe und
+    Lesezugriffe nach einem Schreibvorgang auf dem Primary bleiben und ausgeworfene Replicas übersprungen werden.
+    """
+    import database
+
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=primary)
+    Base.metadata.create_all(bind=replica)
+    with replica.begin() as connection:
+        connection.execute(models.User.__table__.insert().values(
+            username="replicauser", email="replica@example.com", password_hash="x"
+        ))
+    replicas = database.ReplicaSet([replica])
+    RoutingSessionLocal = sessionmaker(bind=primary, class_=database.RoutingSession, replicas=replicas)
+
+    db = RoutingSessionLocal()
+    db.add(models.User(username="primaryuser", email="primary@example.com", password_hash="x"))
+    db.commit()
+    with database.read_only(db):
+        # Session hat bereits geschrieben: read-your-writes auf dem Primary
+        assert db.query(models.User).filter_by(username="primaryuser").first() is not None
+    db.close()
+
+    db = RoutingSessionLocal()
+    with database.read_only(db):
+        assert db.query(models.User).filter_by(username="replicauser").first() is not None
+        assert db.query(models.User).filter_by(username="primaryuser").first() is None
+    assert db.query(models.User).filter_by(username="primaryuser").first() is not None
+    db.close()
+
+    replicas.eject(replica)
+    db = RoutingSessionLocal()
+    with database.read_only(db):
+        assert db.query(models.User).filter_by(username="primaryuser").first() is not None
+    db.close()
+
+# Test für den asynchronen Datenbankmodus
+def test_async_mode_register_login_and_me(setup_db):
+    """
+    Testet Registrierung, Login und `/users/me` mit den asynchronen Endpunkten (aiosqlite auf der Testdatenbank).
+    """
+    pytest.importorskip("aiosqlite")
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    import main
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def get_test_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(main.async_routes)
+    async_app.dependency_overrides[main.get_async_db] = get_test_async_db
+    async_client = TestClient(async_app)
+
+    user = {"username": "asyncuser", "email": "async@example.com", "password": "password123"}
+    assert async_client.post("/register", json=user).status_code == 200
+    duplicate = async_client.post("/register", json={**user, "username": "other"})
+    assert duplicate.status_code == 400
+    assert duplicate.json()["detail"] == "Email already registered"
+
+    token = async_client.post(
+        "/token", data={"username": "asyncuser", "password": "password123"}
+    ).json()["access_token"]
+    response = async_client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["username"] == "asyncuser"
+
+# Test für den Metrics-Endpunkt
+def test_metrics_endpoint(setup_db):
+    """
+    Testet, dass `/metrics` Routen-, SQL- und Hashing-Metriken im Prometheus-Textformat liefert.
+    """
+    metrics.instrument_engine(engine, name="test")
+    client.post(
+        "/register",
+        json={
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "password123",
+        }
+    )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/register",status="200"}' in body
+    assert 'db_statement_duration_seconds_count{engine="test",statement="INSERT"}' in body
+    assert 'password_hash_duration_seconds_count{operation="hash"}' in body
+    assert "# TYPE db_pool_connections gauge" in body
+
+def test_metrics_failed_statement_keeps_timing_balanced():
+    """
+    Testet, dass eine fehlgeschlagene SQL-Anweisung keine Startzeit auf der Verbindung zurücklässt.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    failing_engine = create_engine("sqlite://")
+    metrics.instrument_engine(failing_engine, name="failing")
+    with failing_engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing_table"))
+        assert connection.info["metrics_query_start"] == []
+        connection.execute(text("SELECT 1"))
+        assert connection.info["metrics_query_start"] == []
+    metrics._instrumented_engines.pop("failing")
+    failing_engine.dispose()
+
 # Test für die Home-Route
 def test_home_route():
     """
@@ -216,8 +513,849 @@ def test_home_route():
     assert response.status_code == 200
     assert "text/html" in response.headers["content-type"]
 
+# Test für das Hashing-Pool-Limit
+def test_register_rejected_when_hashing_queue_full(setup_db):
+    """
+    Testet, dass eine Registrierung mit 503 und Retry-After abgelehnt wird, wenn die Hashing-Warteschlange voll ist.
+    """
+    original_limit = hashing.pool.max_pending
+    hashing.pool.max_pending = 0
+    try:
+        response = client.post(
+            "/register",
+            json={
+                "username": "testuser",
+                "email": "testuser@example.com",
+                "password": "password123",
+            }
+        )
+    finally:
+        hashing.pool.max_pending = original_limit
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+# Test für den JWKS-Endpunkt
+def test_jwks_allows_local_token_verification(setup_db):
+    """
+    Testet, dass ein Token allein mit den Schlüsseln aus `/.well-known/jwks.json` geprüft werden kann
+    und die Claims für nachgelagerte Dienste enthält. Überprüft auch das Caching per ETag.
+    """
+    from jose import jwt
+
+    client.post(
+        "/register",
+        json={
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "password123",
+        }
+    )
+    token = client.post(
+        "/token",
+        data={"username": "testuser", "password": "password123"},
+    ).json()["access_token"]
+
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "max-age" in response.headers["Cache-Control"]
+    jwks = response.json()
+    kid = jwt.get_unverified_header(token)["kid"]
+    key = next(key for key in jwks["keys"] if key["kid"] == kid)
+    claims = jwt.decode(token, key, algorithms=[key["alg"]])
+    assert claims["sub"] == "testuser"
+    assert claims["email"] == "testuser@example.com"
+    assert isinstance(claims["uid"], int)
+
+    cached = client.get("/.well-known/jwks.json", headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+def test_unknown_kid_reloads_key_directory(setup_db, monkeypatch):
+    """
+    Testet, dass ein Token mit einem Schlüssel eines anderen Workers (neue Datei im Schlüsselverzeichnis)
+    ohne Neustart akzeptiert wird.
+    """
+    from jose import jwt
+
+    monkeypatch.setattr(auth, "JWT_KEYS_RELOAD_SECONDS", 0)
+    auth.keyring.signing_key()
+    path = os.path.join(auth.keyring.directory, "00000000000000-other.pem")
+    with open(path, "wb") as handle:
+        handle.write(auth._generate_private_key(auth.ALGORITHM))
+    try:
+        other = auth.KeyRing(directory=auth.keyring.directory, active_kid="00000000000000-other")
+        kid, key = other.signing_key()
+        token = jwt.encode({"sub": "testuser"}, key, algorithm=auth.ALGORITHM, headers={"kid": kid})
+        assert auth.decode_access_token(token)["sub"] == "testuser"
+        assert auth.keyring.active_kid != kid
+    finally:
+        os.remove(path)
+
+# Tests für die Massenregistrierung
+def test_register_bulk_json_array(admin_headers):
+    """
+    Testet die Massenregistrierung mit einem JSON-Array.
+    Überprüft, dass doppelte Benutzernamen (in der Datenbank und im Batch) pro Zeile abgelehnt werden.
+    """
+    client.post(
+        "/register",
+        json={
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "password123",
+        }
+    )
+    response = client.post(
+        "/register/bulk",
+        json=[
+            {"username": "testuser", "email": "other@example.com", "password": "password123"},
+            {"username": "bulk1", "email": "bulk1@example.com", "password": "password123"},
+            {"username": "bulk1", "email": "bulk1b@example.com", "password": "password123"},
+            {"username": "bulk2", "email": "not-an-email", "password": "password123"},
+            {"username": "bulk3", "email": "bulk3@example.com", "password": "password123"},
+        ],
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2
+    assert [result["status"] for result in body["results"]] == [
+        "rejected", "created", "rejected", "rejected", "created"
+    ]
+    assert body["results"][0]["detail"] == "Username already registered"
+
+    login_response = client.post(
+        "/token",
+        data={"username": "bulk3", "password": "password123"},
+    )
+    assert login_response.status_code == 200
+
+def test_register_bulk_ndjson(admin_headers):
+    """
+    Testet die Massenregistrierung mit NDJSON, inklusive einer ungültigen Zeile.
+    """
+    payload = "\n".join([
+        '{"username": "bulk1", "email": "bulk1@example.com", "password": "password123"}',
+        '{"username": "bulk2", "email": ',
+        '{"username": "bulk3", "email": "bulk3@example.com", "password": "password123"}',
+    ])
+    response = client.post(
+        "/register/bulk",
+        content=payload,
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+    assert response.json()["results"][1]["status"] == "rejected"
+
+def test_register_bulk_malformed_array(admin_headers):
+    """
+    Testet, dass ein fehlerhaftes JSON-Array mit 400 abgelehnt wird, die Ergebnisse der Zeilen davor
+    aber zurückgegeben werden, und dass nur Administratoren importieren dürfen.
+    """
+    response = client.post(
+        "/register/bulk",
+        content='{"username": "bulk1"}',
+        headers={**admin_headers, "Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/register/bulk",
+        content='[{"username": "bulk1", "email": "bulk1@example.com", "password": "password123"}, {"user',
+        headers={**admin_headers, "Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+    body = response.json()
+    assert body["created"] == 1
+    assert body["results"][0]["username"] == "bulk1"
+    assert "Malformed" in body["error"]
+
+    response = client.post(
+        "/register/bulk",
+        content='[{"username": "' + "x" * 70000,
+        headers={**admin_headers, "Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+    assert "exceeds" in response.json()["error"]
+
+    auth.ADMIN_USERNAMES.discard("admin")
+    assert client.post("/register/bulk", json=[], headers=admin_headers).status_code == 403
+    assert client.post("/register/bulk", json=[]).status_code == 401
+
+def test_register_bulk_interrupted_reports_rows(admin_headers, monkeypatch):
+    """
+    Testet, dass ein Abbruch mitten im Import (volle Hashing-Warteschlange) die bereits gespeicherten
+    Zeilen meldet und alle übrigen pro Zeile als fehlgeschlagen markiert.
+    """
+    import asyncio
+    import bulk_import
+
+    original = hashing.hash_passwords
+    calls = []
+
+    async def hash_once(passwords):
+        calls.append(1)
+        if len(calls) > 1:
+            raise hashing.HashingQueueFull("busy")
+        return await original(passwords)
+
+    monkeypatch.setattr(hashing, "hash_passwords", hash_once)
+
+    async def records():
+        for i in range(5):
+            yield i, {"username": f"bulk{i}", "email": f"bulk{i}@example.com", "password": "password123"}
+
+    db = TestingSessionLocal()
+    try:
+        importer = bulk_import.BulkImporter(db, chunk_size=2)
+        summary = bulk_import.summarize(asyncio.run(importer.run(records())))
+    finally:
+        db.close()
+    assert isinstance(importer.error, hashing.HashingQueueFull)
+    assert [result["status"] for result in summary["results"]] == ["created", "created", "failed", "failed", "failed"]
+    assert summary["created"] == 2 and summary["failed"] == 3 and summary["rejected"] == 0
+
+    response = client.post(
+        "/register/bulk",
+        json=[{"username": "bulk9", "email": "bulk9@example.com", "password": "password123"}],
+        headers=admin_headers,
+    )
+    assert response.status_code == 503
+    assert response.json()["results"] == [
+        {"row": 0, "username": "bulk9", "status": "failed", "detail": "Not imported"}
+    ]
+
+# Test für das verzögerte Schreiben von last_login
+def test_login_updates_last_login_after_flush(setup_db):
+    """
+    Testet, dass last_login nach dem Login gepuffert und beim Flush in die Datenbank geschrieben wird.
+    """
+    client.post(
+        "/register",
+        json={
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "password123",
+        }
+    )
+    token = client.post(
+        "/token",
+        data={"username": "testuser", "password": "password123"},
+    ).json()["access_token"]
+    login_tracker.buffer.flush()
+    assert login_tracker.buffer.last_batch_size == 1
+
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["last_login"] is not None
+
+def test_last_login_buffer_keeps_newest():
+    """
+    Testet, dass pro Benutzer nur der neueste Zeitstempel gepuffert wird.
+    """
+    from datetime import datetime
+
+    buffer = login_tracker.LastLoginBuffer(session_factory=TestingSessionLocal)
+    buffer._stopping.set()
+    buffer.record(1, "testuser", datetime(2024, 1, 2))
+    buffer.record(1, "testuser", datetime(2024, 1, 1))
+    buffer.record(2, "other", datetime(2024, 1, 1))
+    assert buffer.pending == 2
+    assert buffer._pending[1][1] == datetime(2024, 1, 2)
+
+def test_last_login_failed_flush_keeps_age():
+    """
+    Testet, dass nach einem fehlgeschlagenen Flush das Alter des ältesten Eintrags erhalten bleibt.
+    """
+    from sqlalchemy.exc import OperationalError
+
+    def failing_session():
+        raise OperationalError("UPDATE", {}, Exception("database is locked"))
+
+    buffer = login_tracker.LastLoginBuffer(session_factory=failing_session)
+    buffer._stopping.set()
+    buffer.record(1, "testuser")
+    queued_at = buffer._oldest
+    time.sleep(0.01)
+    assert buffer.flush() == 0
+    assert buffer.pending == 1 and buffer._oldest == queued_at
+    buffer.record(2, "other")
+    assert buffer._oldest == queued_at
+
+def test_last_login_flusher_survives_unexpected_errors(monkeypatch):
+    """
+    Testet, dass der Flush-Thread nach einem unerwarteten Fehler weiterläuft und die Einträge behält.
+    """
+    buffer = login_tracker.LastLoginBuffer(session_factory=TestingSessionLocal, interval_ms=5)
+    failures = []
+
+    def broken_write(batch):
+        failures.append(len(batch))
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(buffer, "_write", broken_write)
+    monkeypatch.setattr(token_cache.cache, "invalidate_user", lambda username: 1 / 0)
+    buffer.record(1, "testuser")
+    deadline = time.monotonic() + 2
+    while len(failures) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(failures) >= 2 and buffer.alive and buffer.pending == 1
+    assert buffer.flush_errors >= 2
+
+    monkeypatch.setattr(buffer, "_write", lambda batch: None)
+    deadline = time.monotonic() + 2
+    while buffer.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert buffer.pending == 0 and buffer.alive
+    monkeypatch.undo()
+    buffer.stop()
+    assert not buffer.alive
+
+# Tests für die schlanken Abfragen
+def test_user_profile_projection_without_password_hash(setup_db):
+    """
+    Testet, dass das Profil ohne Passwort-Hash geladen wird und als UserResponse gültig ist.
+    """
+    import schemas
+    import user_queries
+
+    client.post("/register", json={
+        "username": "leanuser",
+        "email": "leanuser@example.com",
+        "first_name": "Lean",
+        "last_name": "User",
+        "password": "securepassword"
+    })
+    db = TestingSessionLocal()
+    try:
+        profile = user_queries.get_user_profile(db, "leanuser")
+        credentials = user_queries.get_user_credentials(db, "leanuser")
+        assert user_queries.get_user_profile(db, "unknown") is None
+    finally:
+        db.close()
+    assert not hasattr(profile, "password_hash")
+    assert schemas.UserResponse.model_validate(profile).email == "leanuser@example.com"
+    assert auth.verify_password("securepassword", credentials.password_hash)
+
+# Tests für den Token-Cache
+def test_read_users_me_cache_invalidated_on_update(setup_db):
+    """
+    Testet, dass `/users/me` nach einer Änderung des Benutzers nicht mehr die gecachten Daten liefert.
+    """
+    client.post(
+        "/register",
+        json={
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "password123",
+            "first_name": "Test",
+            "last_name": "User"
+        }
+    )
+    token = client.post(
+        "/token",
+        data={"username": "testuser", "password": "password123"},
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).json()["first_name"] == "Test"
+    assert client.get("/users/me", headers=headers).json()["first_name"] == "Test"
+    assert token_cache.cache.hits >= 1
+
+    db = TestingSessionLocal()
+    db.query(models.User).filter(models.User.username == "testuser").one().first_name = "Changed"
+    db.commit()
+    db.close()
+
+    assert client.get("/users/me", headers=headers).json()["first_name"] == "Changed"
+
+def test_token_cache_invalidated_after_commit(setup_db):
+    """
+    Testet, dass der Token-Cache erst nach dem Commit invalidiert wird und ein Rollback nichts invalidiert.
+    """
+    client.post("/register", json={"username": "testuser", "email": "testuser@example.com", "password": "password123"})
+    token = client.post("/token", data={"username": "testuser", "password": "password123"}).json()["access_token"]
+    login_tracker.buffer.flush()  # Sonst invalidiert der last_login-Flush den Cache während des Tests
+    client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert len(token_cache.cache) == 1
+
+    db = TestingSessionLocal()
+    db.query(models.User).filter(models.User.username == "testuser").one().first_name = "Changed"
+    db.flush()
+    assert len(token_cache.cache) == 1
+    db.rollback()
+    assert len(token_cache.cache) == 1
+
+    db.query(models.User).filter(models.User.username == "testuser").one().first_name = "Changed"
+    db.flush()
+    db.commit()
+    db.close()
+    assert len(token_cache.cache) == 0
+
+def test_token_cache_single_flight():
+    """
+    Testet, dass gleichzeitige Anfragen mit demselben Token nur einen Ladevorgang auslösen.
+    """
+    import threading
+    import time
+
+    cache = token_cache.TokenCache(ttl=60, max_entries=10)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"sub": "testuser"}, "principal", "testuser"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("token", loader).principal))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ["principal"] * 5
+
+# Tests für die Benutzerliste
+def test_list_users_keyset_pagination_and_search(setup_db):
+    """
+    Testet die Benutzerliste mit Cursor-Paginierung, Präfixsuche, NDJSON-Export und Admin-Prüfung.
+    """
+    client.post("/register", json={"username": "admin", "email": "admin@example.com", "password": "password123"})
+    token = client.post("/token", data={"username": "admin", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users", headers=headers).status_code == 403
+
+    auth.ADMIN_USERNAMES.add("admin")
+    try:
+        client.post(
+            "/register/bulk",
+            json=[
+                {"username": f"user{i:02d}", "email": f"user{i:02d}@example.com", "password": "password123"}
+                for i in range(12)
+            ],
+            headers=headers,
+        )
+        usernames, cursor = [], None
+        while True:
+            params = {"limit": 5, "username": "user"}
+            if cursor:
+                params["cursor"] = cursor
+            page = client.get("/users", params=params, headers=headers).json()
+            usernames += [user["username"] for user in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert usernames == [f"user{i:02d}" for i in range(12)]
+
+        by_date = client.get("/users", params={"order": "date_created", "limit": 20}, headers=headers).json()
+        assert len(by_date["items"]) == 13
+
+        assert client.get("/users", params={"username": "user1"}, headers=headers).json()["items"][0]["username"] == "user10"
+        assert client.get("/users", params={"username": "user_"}, headers=headers).json()["items"] == []
+        assert client.get("/users", params={"cursor": "garbage"}, headers=headers).status_code == 400
+
+        export = client.get("/users", params={"format": "ndjson", "email": "user0"}, headers=headers)
+        assert export.headers["content-type"].startswith("application/x-ndjson")
+        assert len(export.text.strip().splitlines()) == 10
+    finally:
+        auth.ADMIN_USERNAMES.discard("admin")
+
+def test_list_users_date_created_pages(setup_db):
+    """
+    Testet die Cursor-Paginierung nach Erstellungsdatum über mehrere Seiten, wenn alle Benutzer
+    in derselben Sekunde erstellt wurden (gleiches date_created).
+    """
+    db = TestingSessionLocal()
+    db.add_all([
+        models.User(username=f"same{i}", email=f"same{i}@example.com", password_hash="x") for i in range(7)
+    ])
+    db.commit()
+    db.close()
+    client.post("/register", json={"username": "admin", "email": "admin@example.com", "password": "password123"})
+    token = client.post("/token", data={"username": "admin", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    auth.ADMIN_USERNAMES.add("admin")
+    try:
+        usernames, cursor = [], None
+        while True:
+            params = {"order": "date_created", "limit": 3, "username": "same"}
+            if cursor:
+                params["cursor"] = cursor
+            page = client.get("/users", params=params, headers=headers).json()
+            usernames += [user["username"] for user in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert usernames == [f"same{i}" for i in range(7)]
+
+        db = TestingSessionLocal()
+        try:
+            filters = user_search.UserFilter(username="same", order="date_created")
+            lines = list(user_search.export_ndjson(db, filters, batch_size=3))
+        finally:
+            db.close()
+        assert [json.loads(line)["username"] for line in lines] == usernames
+    finally:
+        auth.ADMIN_USERNAMES.discard("admin")
+
+# Tests für die Bibliotheks-API
+def test_library_rest_crud(setup_db):
+    """
+    Testet das Anlegen, Lesen, Aktualisieren und Löschen von Büchern und Autoren über REST.
+    """
+    author = client.post("/authors", json={"name": "Max Frisch", "birthdate": "1911-05-15"})
+    assert author.status_code == 201
+    author_id = author.json()["id"]
+    book = client.post(
+        "/books",
+        json={"title": "Homo Faber", "publicationYear": 1957, "authors": [author_id]},
+    )
+    assert book.status_code == 201
+    book_id = book.json()["id"]
+    assert book.json()["authors"][0]["name"] == "Max Frisch"
+
+    assert client.get(f"/authors/{author_id}").json()["books"][0]["title"] == "Homo Faber"
+    updated = client.put(f"/books/{book_id}", json={"title": "Stiller", "authors": []})
+    assert updated.json()["title"] == "Stiller"
+    assert updated.json()["authors"] == []
+    assert client.post("/books", json={"title": "X", "authors": ["999"]}).status_code == 400
+    assert client.delete(f"/books/{book_id}").status_code == 204
+    assert client.get(f"/books/{book_id}").status_code == 404
+
+def test_library_graphql_nested_query_count(setup_db):
+    """
+    Testet, dass eine verschachtelte GraphQL-Abfrage `books { authors { books } }` pro Ebene
+    genau eine SQL-Abfrage ausführt (kein N+1).
+    """
+    pytest.importorskip("graphql")
+    from sqlalchemy import event
+
+    author_ids = [client.post("/authors", json={"name": f"Author {i}"}).json()["id"] for i in range(5)]
+    for i in range(10):
+        client.post("/books", json={"title": f"Book {i}", "authors": author_ids[i % 5:i % 5 + 2]})
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.post(
+            "/graphql",
+            json={"query": "{ books { title authors { name books { title } } } }"},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200
+    books = response.json()["data"]["books"]
+    assert len(books) == 10
+    assert books[0]["authors"][0]["books"][0]["title"] == "Book 0"
+    assert len(statements) == 3
+
+def test_library_graphql_mutation(setup_db):
+    """
+    Testet das Anlegen eines Autors und eines Buchs über GraphQL-Mutationen.
+    """
+    pytest.importorskip("graphql")
+    author = client.post(
+        "/graphql",
+        json={"query": 'mutation { createAuthor(input: {name: "Dürrenmatt"}) { id name } }'},
+    ).json()["data"]["createAuthor"]
+    response = client.post(
+        "/graphql",
+        json={
+            "query": "mutation($input: BookInput!) { createBook(input: $input) { title authors { name } } }",
+            "variables": {"input": {"title": "Der Besuch der alten Dame", "authors": [author["id"]]}},
+        },
+    )
+    assert response.json()["data"]["createBook"]["authors"] == [{"name": "Dürrenmatt"}]
+
+def test_library_graphql_mutation_sql_in_worker_threads(setup_db):
+    """
+    Testet, dass nach einer GraphQL-Mutation keine SQL-Abfrage mehr auf dem Event-Loop-Thread
+    läuft (kein verzögertes Nachladen der nach dem Commit abgelaufenen Attribute).
+    """
+    pytest.importorskip("graphql")
+    import threading
+    from sqlalchemy import event
+
+    threads = []
+
+    def record_thread(conn, cursor, statement, parameters, context, executemany):
+        threads.append((threading.current_thread().name, statement.split()[0]))
+
+    event.listen(engine, "before_cursor_execute", record_thread)
+    try:
+        author = client.post(
+            "/graphql",
+            json={"query": 'mutation { createAuthor(input: {name: "Frisch"}) { id name birthdate } }'},
+        ).json()["data"]["createAuthor"]
+        updated = client.post(
+            "/graphql",
+            json={"query": 'mutation { updateAuthor(id: "%s", input: {name: "Max Frisch"}) { id name } }'
+                  % author["id"]},
+        ).json()["data"]["updateAuthor"]
+    finally:
+        event.remove(engine, "before_cursor_execute", record_thread)
+    assert author["name"] == "Frisch" and updated["name"] == "Max Frisch"
+    assert threads and all(name.startswith("AnyIO worker thread") for name, _ in threads), threads
+
+def test_library_graphql_invalid_body(setup_db):
+    """
+    Testet, dass ein ungültiger JSON-Body oder ein JSON-Wert, der kein Objekt ist, mit 400 beantwortet wird.
+    """
+    pytest.importorskip("graphql")
+
+    for body in ("{not json", "[1, 2]", "\xff"):
+        response = client.post("/graphql", content=body.encode("latin-1"), headers={"Content-Type": "application/json"})
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["message"] == "Request body must be a JSON object"
+
+# Tests für die statischen Dateien
+def test_static_asset_hashed_url_etag_and_range():
+    """
+    Testet die inhaltsbasierte URL mit unveränderlichem Caching, die 304-Antwort per ETag
+    und Range-Anfragen für große Medien.
+    """
+    import main
+
+    url = main.static_assets.url("animation.gif")
+    assert url != "/static/animation.gif"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+
+    plain = client.get("/static/animation.gif")
+    assert plain.status_code == 200
+    assert plain.content == response.content
+    assert client.get("/static/animation.gif", headers={"If-None-Match": plain.headers["ETag"]}).status_code == 304
+
+    partial = client.get("/static/animation.gif", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206
+    assert partial.content == plain.content[:100]
+    assert partial.headers["Content-Range"] == f"bytes 0-99/{len(plain.content)}"
+
+    assert client.get("/static/animation.0000000000.gif").status_code == 404
+    digest = url.rsplit(".", 2)[1]
+    for truncated in (digest[:1], digest[:11], ""):
+        assert client.get(f"/static/animation.{truncated}.gif").status_code == 404
+    assert client.get("/static/../main.py").status_code == 404
+
+def test_home_route_cached_and_compressed():
+    """
+    Testet, dass die Startseite komprimiert ausgeliefert wird und per ETag revalidiert werden kann.
+    """
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "FastAPI Authentication" in response.text
+    etag = response.headers["ETag"]
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+# Tests für die Zulassungskontrolle
+def test_admission_queue_bounded_and_deadline():
+    """
+    Testet, dass Anfragen bei voller Warteschlange oder zu knapper Deadline sofort abgelehnt werden.
+    """
+    import asyncio
+    import admission
+
+    async def scenario():
+        route_class = admission.RouteClass("test", concurrency=1, max_queue=1, max_wait=1)
+        route_class.service_time = 0.2
+        await route_class.acquire()
+        waiting = asyncio.ensure_future(route_class.acquire())
+        await asyncio.sleep(0)
+        assert route_class.queued == 1
+        with pytest.raises(admission.Shed) as full:
+            await route_class.acquire()
+        assert full.value.reason == "queue_full"
+        route_class.release(0.2)
+        await waiting
+        loop = asyncio.get_running_loop()
+        with pytest.raises(admission.Shed) as late:
+            await route_class.acquire(deadline=loop.time() + 0.05)
+        assert late.value.reason == "deadline"
+        route_class.release(0.2)
+        assert route_class.active == 0
+        return route_class.shed
+
+    assert asyncio.run(scenario()) == {"queue_full": 1, "deadline": 1, "timeout": 0}
+
+def test_admission_rejects_expired_client_deadline(setup_db):
+    """
+    Testet, dass eine bereits abgelaufene Client-Deadline mit 503 und Retry-After beantwortet wird.
+    """
+    response = client.get("/users/me", headers={"X-Request-Timeout-Ms": "0"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/health/live", headers={"X-Request-Timeout-Ms": "0"}).status_code == 200
+
+# Tests für Migrationen und Startzeit
+def test_migrations_match_models(tmp_path):
+    """
+    Testet, dass `alembic upgrade head` genau das Schema der Modelle erzeugt.
+    """
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    import database
+
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    database.run_migrations(url)
+    migrated = create_engine(url)
+    with migrated.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+    migrated.dispose()
+
+def test_startup_report():
+    """
+    Testet, dass der Startbericht die Importzeit enthält und Phasen erfasst.
+    """
+    import startup
+
+    response = client.get("/health/startup")
+    assert response.status_code == 200
+    assert {"imports", "app_setup"} <= set(response.json()["phases"])
+    report = startup.StartupReport()
+    with report.phase("step"):
+        pass
+    report.ready()
+    assert report.as_dict()["ready"] and report.phases["step"] >= 0
+
+# Tests für die Lasttests
+def test_load_benchmark_detects_regressions():
+    """
+    Testet die Perzentile und dass Verschlechterungen über dem Schwellwert erkannt werden.
+    """
+    from benchmarks import load
+
+    assert load.percentile([1, 2, 3, 4], 50) == 2
+    assert load.percentile([1, 2, 3, 4], 99) == 4
+    stats = load.summarize([0.01, 0.02], [200, 503], elapsed=1)
+    assert stats["rps"] == 2 and stats["error_rate"] == 0.5
+    baseline = {"results": {"read_mix": {"rps": 100, "p95_ms": 10, "p99_ms": 20, "error_rate": 0}}}
+    same = {"read_mix": {"rps": 95, "p95_ms": 11, "p99_ms": 21, "error_rate": 0}}
+    slower = {"read_mix": {"rps": 50, "p95_ms": 30, "p99_ms": 21, "error_rate": 0.1}}
+    assert load.compare(same, baseline, threshold=20) == []
+    assert len(load.compare(slower, baseline, threshold=20)) == 3
+
+# Tests für das Profiling
+def test_profiling_admin_header(setup_db, tmp_path):
+    """
+    Testet, dass nur Admins per Header ein Profil auslösen und die Stacks im Collapsed-Format
+    sowie in der Zusammenfassung pro Route landen.
+    """
+    import profiling
+
+    import anyio.to_thread
+
+    run_sync = anyio.to_thread.run_sync
+    profiler = profiling.Profiler(directory=str(tmp_path), interval_ms=0.2)
+    profiled_client = TestClient(profiling.ProfilingMiddleware(app, routes_app=app, profiler=profiler))
+    for name in ("profadmin", "profuser"):
+        client.post("/register", json={
+            "username": name, "email": f"{name}@example.com", "password": "password123",
+            "first_name": "Prof", "last_name": "User"
+        })
+    tokens = {
+        name: client.post("/token", data={"username": name, "password": "password123"}).json()["access_token"]
+        for name in ("profadmin", "profuser")
+    }
+    auth.ADMIN_USERNAMES.add("profadmin")
+    try:
+        response = profiled_client.get("/users/me", headers={
+            "Authorization": f"Bearer {tokens['profuser']}", "X-Profile": "1"})
+        assert response.status_code == 200 and "x-profile-id" not in response.headers
+
+        response = profiled_client.get("/users/me", headers={
+            "Authorization": f"Bearer {tokens['profadmin']}", "X-Profile": "1"})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+        summary = profiler.summary()
+        assert summary["routes"]["/users/me"]["requests"] == 1
+        assert summary["routes"]["/users/me"]["samples"] > 0
+        stack, count = profiler.read(profile_id).splitlines()[0].rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+
+        forbidden = client.get("/debug/profiles", headers={"Authorization": f"Bearer {tokens['profuser']}"})
+        assert forbidden.status_code == 403
+        allowed = client.get("/debug/profiles", headers={"Authorization": f"Bearer {tokens['profadmin']}"})
+        assert allowed.status_code == 200 and allowed.json()["enabled"] is False
+    finally:
+        auth.ADMIN_USERNAMES.discard("profadmin")
+        profiler.uninstall()
+    assert anyio.to_thread.run_sync is run_sync
+
+# Tests für das strukturierte Logging
+def test_request_id_header_and_json_record():
+    """
+    Testet, dass die Request-ID übernommen bzw. erzeugt wird und im JSON-Datensatz erscheint.
+    """
+    import logging
+    import queue
+    import sys
+    import structured_logging
+
+    assert client.get("/health", headers={"X-Request-ID": "abc-123"}).headers["x-request-id"] == "abc-123"
+    assert len(client.get("/health", headers={"X-Request-ID": "bad id!"}).headers["x-request-id"]) == 32
+
+    token = structured_logging.request_id.set("req-1")
+    try:
+        record = logging.LogRecord("main", logging.ERROR, __file__, 1, "Database error: %s", ("boom",), None)
+        record.status = 503
+        structured_logging.RequestIdFilter().filter(record)
+    finally:
+        structured_logging.request_id.reset(token)
+    entry = json.loads(structured_logging.JsonFormatter().format(record))
+    assert entry["message"] == "Database error: boom"
+    assert entry["request_id"] == "req-1" and entry["status"] == 503
+
+    # Vor dem Einreihen: Argumente und Traceback werden sofort festgehalten
+    handler = structured_logging.NonBlockingQueueHandler(queue.Queue())
+    args = {"count": 1}
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.LogRecord("main", logging.ERROR, __file__, 1, "State: %s", (args,), sys.exc_info())
+    handler.handle(record)
+    args["count"] = 2
+    queued = handler.queue.get_nowait()
+    assert queued.exc_info is None and queued.args is None
+    entry = json.loads(structured_logging.JsonFormatter().format(queued))
+    assert entry["message"] == "State: {'count': 1}"
+    assert "RuntimeError: boom" in entry["exception"]
+
+def test_repeated_errors_are_capped():
+    """
+    Testet, dass gleiche Fehlermeldungen pro Zeitfenster begrenzt und unterdrückte gezählt werden.
+    """
+    import logging
+    import structured_logging
+
+    capped = structured_logging.RepeatLimitFilter(limit=2, window=0.05)
+
+    def record(arg):
+        return logging.LogRecord("main", logging.ERROR, __file__, 1, "Database error: %s", (arg,), None)
+
+    assert [capped.filter(record(i)) for i in range(5)] == [True, True, False, False, False]
+    assert capped.filter(logging.LogRecord("main", logging.INFO, __file__, 1, "Database error: %s", (1,), None))
+    time.sleep(0.06)
+    first = record("again")
+    assert capped.filter(first) and first.suppressed == 3
+    assert not structured_logging.SamplingFilter({logging.DEBUG: 0}).filter(
+        logging.LogRecord("main", logging.DEBUG, __file__, 1, "debug", (), None))
+
 # Bereinigung nach allen Tests
 @pytest.fixture(scope="session", autouse=True)
 def teardown_db():
     yield
+    health.probe.stop()
+    login_tracker.buffer.stop()
     Base.metadata.drop_all(bind=engine)
+    hashing.pool.shutdown()
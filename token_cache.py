@@ -0,0 +1,227 @@
+# token_cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration variables
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class CachedPrincipal:
+    __slots__ = ("claims", "principal", "username", "expires_at")
+
+    def __init__(self, claims: dict, principal, username: str, expires_at: float):
+        self.claims = claims
+        self.principal = principal
+        self.username = username
+        self.expires_at = expires_at
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TokenCache:
+    """LRU cache of verified tokens and the principal they resolve to.
+
+    Entries are keyed by the SHA-256 digest of the token and expire at the token's
+    ``exp`` claim or after ``ttl`` seconds, whichever comes first. Concurrent misses for
+    the same token are coalesced so only one caller runs the loader.
+    """
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL_SECONDS, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._flights = {}
+        self._async_flights = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, token: str):
+        key = token_digest(token)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+            return entry
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_load(self, token: str, loader):
+        """Return the cached entry for ``token`` or build it with ``loader()``.
+
+        ``loader`` returns ``(claims, principal, username)`` and may raise; the exception is
+        propagated to every caller waiting on the same token.
+        """
+        key = token_digest(token)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            generation = self._generation
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = entry = self._build(*loader())
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self._store_if_current(key, generation, flight.result)
+            flight.done.set()
+        return entry
+
+    async def get_or_load_async(self, token: str, loader):
+        """Async variant of :meth:`get_or_load`; ``loader`` is a coroutine function.
+
+        Waiting callers await a future instead of blocking a thread, so this is safe to
+        use from code running on the event loop.
+        """
+        key = token_digest(token)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            future = self._async_flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+            generation = self._generation
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        entry = None
+        try:
+            entry = self._build(*await loader())
+            future.set_result(entry)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        finally:
+            with self._lock:
+                del self._async_flights[key]
+                self._store_if_current(key, generation, entry)
+        return entry
+
+    def _build(self, claims: dict, principal, username: str) -> CachedPrincipal:
+        expires_at = time.time() + self.ttl
+        if claims.get("exp") is not None:
+            expires_at = min(expires_at, float(claims["exp"]))
+        return CachedPrincipal(claims, principal, username, expires_at)
+
+    def _store_if_current(self, key: str, generation: int, entry):
+        # Skip storing if a user row changed while we were loading
+        if entry is not None and generation == self._generation:
+            self._store(key, entry)
+
+    def _store(self, key: str, entry: CachedPrincipal):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(entry.username, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        keys = self._by_user.get(entry.username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry.username]
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            self._generation += 1
+            stale = list(self._by_user.get(username, ()))
+            for key in stale:
+                self._remove(key)
+        if stale:
+            logger.debug("Dropped %d cached tokens for %s", len(stale), username)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_user.clear()
+
+
+cache = TokenCache()
+
+
+# Invalidate cached principals whenever a user row changes through the ORM. Changed usernames are
+# collected at flush time but only invalidated once the transaction commits: invalidating at flush
+# would let a concurrent request re-cache the old, still committed row before the commit.
+# Core statements (``update(models.User)``) bypass these events; their callers invalidate
+# explicitly (login_tracker) or only change columns the cache does not hold (password_upgrade).
+_STALE_USERS = "token_cache_stale_users"
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    renamed_from = inspect(target).attrs.username.history.deleted or ()
+    object_session(target).info.setdefault(_STALE_USERS, set()).update({target.username, *renamed_from})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for username in session.info.pop(_STALE_USERS, ()):
+        cache.invalidate_user(username)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_users(session):
+    session.info.pop(_STALE_USERS, None)
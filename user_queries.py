@@ -0,0 +1,82 @@
+# user_queries.py
+from sqlalchemy import bindparam, or_, select
+from sqlalchemy.orm import Session
+
+import models
+
+User = models.User
+
+# Built once at import: SQLAlchemy caches the compiled form by statement structure, so
+# reusing the same objects skips rebuilding and re-hashing the expression per request.
+PROFILE_COLUMNS = (
+    User.user_id, User.username, User.email, User.first_name, User.last_name,
+    User.date_created, User.last_login,
+)
+SELECT_PROFILE_BY_USERNAME = select(*PROFILE_COLUMNS).where(User.username == bindparam("username"))
+SELECT_CREDENTIALS_BY_USERNAME = (
+    select(User.user_id, User.username, User.email, User.password_hash)
+    .where(User.username == bindparam("username"))
+)
+
+SELECT_TAKEN_USERNAME_OR_EMAIL = (
+    select(User.username, User.email)
+    .where(or_(User.username == bindparam("username"), User.email == bindparam("email")))
+)
+
+
+class UserProfile:
+    """Column projection of a user without password_hash; readable by ``UserResponse``."""
+
+    __slots__ = ("user_id", "username", "email", "first_name", "last_name", "date_created", "last_login")
+
+    def __init__(self, user_id, username, email, first_name, last_name, date_created, last_login):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.date_created = date_created
+        self.last_login = last_login
+
+
+class UserCredentials:
+    """The columns needed to check a password and issue a token."""
+
+    __slots__ = ("user_id", "username", "email", "password_hash")
+
+    def __init__(self, user_id, username, email, password_hash):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self.password_hash = password_hash
+
+
+def get_user_profile(db: Session, username: str):
+    row = db.execute(SELECT_PROFILE_BY_USERNAME, {"username": username}).first()
+    return UserProfile(*row) if row is not None else None
+
+
+def get_user_credentials(db: Session, username: str):
+    row = db.execute(SELECT_CREDENTIALS_BY_USERNAME, {"username": username}).first()
+    return UserCredentials(*row) if row is not None else None
+
+
+def find_taken(db: Session, username: str, email: str):
+    """(username taken, email taken) for a registration, in one round trip."""
+    rows = db.execute(SELECT_TAKEN_USERNAME_OR_EMAIL, {"username": username, "email": email}).all()
+    return any(row.username == username for row in rows), any(row.email == email for row in rows)
+
+
+async def get_user_profile_async(db, username: str):
+    row = (await db.execute(SELECT_PROFILE_BY_USERNAME, {"username": username})).first()
+    return UserProfile(*row) if row is not None else None
+
+
+async def get_user_credentials_async(db, username: str):
+    row = (await db.execute(SELECT_CREDENTIALS_BY_USERNAME, {"username": username})).first()
+    return UserCredentials(*row) if row is not None else None
+
+
+async def find_taken_async(db, username: str, email: str):
+    rows = (await db.execute(SELECT_TAKEN_USERNAME_OR_EMAIL, {"username": username, "email": email})).all()
+    return any(row.username == username for row in rows), any(row.email == email for row in rows)
@@ -0,0 +1,127 @@
+# user_search.py
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, and_, or_, select, type_coerce
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+ORDERINGS = ("user_id", "date_created")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class UserFilter:
+    """Search parameters for the user listing; prefixes use LIKE 'prefix%' so the column indexes apply."""
+
+    def __init__(self, username: Optional[str] = None, email: Optional[str] = None,
+                 last_login_after: Optional[datetime] = None, last_login_before: Optional[datetime] = None,
+                 order: str = "user_id"):
+        if order not in ORDERINGS:
+            raise ValueError(f"order must be one of {', '.join(ORDERINGS)}")
+        self.username = username
+        self.email = email
+        self.last_login_after = last_login_after
+        self.last_login_before = last_login_before
+        self.order = order
+
+
+def _prefix(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _created_key():
+    """``date_created`` as stored, for the keyset comparison.
+
+    SQLite keeps CURRENT_TIMESTAMP as ``YYYY-MM-DD HH:MM:SS`` text while a bound datetime is
+    rendered with microseconds, so comparing against the parsed value skips rows created in
+    the same second. Comparing against the stored value itself is exact on every backend.
+    """
+    return type_coerce(models.User.date_created, String).label("created_key")
+
+
+def sort_key(row, order: str) -> list:
+    """Keyset position of a row from ``build_query``."""
+    if order == "date_created":
+        created = row.created_key
+        return [str(created) if created is not None else None, row.User.user_id]
+    return [row.User.user_id]
+
+
+def encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if order == "date_created":
+            created, user_id = key
+            if created is not None and not isinstance(created, str):
+                raise InvalidCursor("Invalid cursor")
+            return [created, int(user_id)]
+        (user_id,) = key
+        return [int(user_id)]
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def build_query(filters: UserFilter, after: Optional[list] = None):
+    """Keyset query: rows strictly after the ``after`` key in (order column, user_id) order."""
+    User = models.User
+    query = select(User)
+    if filters.username:
+        query = query.where(User.username.like(_prefix(filters.username), escape="\\"))
+    if filters.email:
+        query = query.where(User.email.like(_prefix(filters.email), escape="\\"))
+    if filters.last_login_after is not None:
+        query = query.where(User.last_login >= filters.last_login_after)
+    if filters.last_login_before is not None:
+        query = query.where(User.last_login < filters.last_login_before)
+
+    if filters.order == "date_created":
+        created_key = _created_key()
+        query = query.add_columns(created_key)
+        if after is not None:
+            created, user_id = after
+            query = query.where(or_(
+                created_key > created,
+                and_(created_key == created, User.user_id > user_id),
+            ))
+        return query.order_by(User.date_created, User.user_id)
+    if after is not None:
+        query = query.where(User.user_id > after[0])
+    return query.order_by(User.user_id)
+
+
+def fetch_page(db: Session, filters: UserFilter, limit: int, cursor: Optional[str] = None) -> dict:
+    after = decode_cursor(cursor, filters.order) if cursor else None
+    # One extra row tells whether another page exists without a COUNT
+    rows = db.execute(build_query(filters, after).limit(limit + 1)).all()
+    next_cursor = encode_cursor(sort_key(rows[limit - 1], filters.order)) if len(rows) > limit else None
+    return {
+        "items": [schemas.UserResponse.model_validate(row.User) for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+def export_ndjson(db: Session, filters: UserFilter, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield every matching user as an NDJSON line, fetching keyset batches of ``batch_size``."""
+    after = None
+    while True:
+        rows = db.execute(build_query(filters, after).limit(batch_size)).all()
+        for row in rows:
+            yield schemas.UserResponse.model_validate(row.User).model_dump_json() + "\n"
+        if len(rows) < batch_size:
+            break
+        after = sort_key(rows[-1], filters.order)
+        db.expunge_all()